@@ -0,0 +1,128 @@
+"""
+FAISS index construction for bot knowledge bases.
+
+Small corpora use an exact IndexFlatL2; larger ones can use HNSW, IVF-Flat
+or IVF-PQ. The chosen type and its search-time parameters (nprobe for IVF,
+efSearch for HNSW) are stored in the bot config under "index" and applied
+again whenever the index is loaded.
+"""
+import math
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+SEARCH_PARAMS = ("nprobe", "ef_search")  # Index settings that only tune search
+
+# Corpus sizes at which "auto" switches to the next index type
+AUTO_FLAT_MAX = 20_000
+AUTO_HNSW_MAX = 200_000
+AUTO_IVF_FLAT_MAX = 1_000_000
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+DEFAULT_EF_SEARCH = 64
+DEFAULT_NPROBE = 16
+PQ_NBITS = 8
+MIN_POINTS_PER_CENTROID = 39  # FAISS warns when training with fewer
+
+# build_index_from_file: vectors an IVF index is trained on (at least), and vectors added per call
+TRAIN_SAMPLE_SIZE = 50_000
+ADD_BATCH_SIZE = 10_000
+
+def choose_index_type(num_vectors):
+    """Pick an index type for "auto" based on corpus size."""
+    if num_vectors <= AUTO_FLAT_MAX:
+        return "flat"
+    if num_vectors <= AUTO_HNSW_MAX:
+        return "hnsw"
+    if num_vectors <= AUTO_IVF_FLAT_MAX:
+        return "ivf_flat"
+    return "ivf_pq"
+
+def _nlist_for(num_vectors):
+    # ~4*sqrt(n) lists, with enough training points per centroid
+    nlist = int(4 * math.sqrt(num_vectors))
+    return max(1, min(nlist, num_vectors // MIN_POINTS_PER_CENTROID))
+
+def _pq_subquantizers(dim):
+    # Largest sub-quantizer count <= dim/8 that divides the dimension (8 dims per code)
+    for m in range(max(1, dim // 8), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+def _new_index(num_vectors, dim, index_type, settings):
+    """Create an empty (untrained) index for num_vectors vectors, plus its bot config settings."""
+    settings = dict(settings or {})
+    if index_type in (None, "", "auto"):
+        index_type = choose_index_type(num_vectors)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Use one of: auto, {', '.join(INDEX_TYPES)}")
+
+    # IVF needs enough vectors to train its coarse quantizer (and PQ its codebooks)
+    if index_type == "ivf_pq" and num_vectors < (2 ** PQ_NBITS) * MIN_POINTS_PER_CENTROID:
+        index_type = "ivf_flat"
+    if index_type == "ivf_flat" and num_vectors < 2 * MIN_POINTS_PER_CENTROID:
+        index_type = "flat"
+
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim), {"type": "flat"}
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, int(settings.get("m", HNSW_M)))
+        index.hnsw.efConstruction = int(settings.get("ef_construction", HNSW_EF_CONSTRUCTION))
+        return index, {"type": "hnsw", "ef_search": int(settings.get("ef_search", DEFAULT_EF_SEARCH))}
+
+    nlist = int(settings.get("nlist", _nlist_for(num_vectors)))
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+    else:
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim), PQ_NBITS)
+    return index, {"type": index_type, "nlist": nlist,
+                   "nprobe": min(int(settings.get("nprobe", DEFAULT_NPROBE)), nlist)}
+
+def build_index(embeddings, index_type="auto", settings=None):
+    """
+    Build and fill a FAISS index for float32 embeddings.
+    Returns (index, index_settings) where index_settings goes in the bot config.
+    """
+    num_vectors, dim = embeddings.shape
+    index, index_settings = _new_index(num_vectors, dim, index_type, settings)
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+    apply_search_params(index, index_settings)
+    return index, index_settings
+
+def build_index_from_file(vectors_path, dim, index_type="auto", settings=None, sample_size=TRAIN_SAMPLE_SIZE):
+    """
+    Like build_index, for the float32 vectors stored in vectors_path. The file is
+    memory-mapped: IVF indexes are trained on an evenly spread sample of it and
+    vectors are added ADD_BATCH_SIZE at a time, so memory stays bounded by the
+    index itself while "auto" still sees the whole corpus size.
+    """
+    vectors = np.memmap(vectors_path, dtype="float32", mode="r").reshape(-1, dim)
+    num_vectors = len(vectors)
+    if not num_vectors:
+        raise ValueError("No vectors to index")
+    index, index_settings = _new_index(num_vectors, dim, index_type, settings)
+    if not index.is_trained:
+        # At least MIN_POINTS_PER_CENTROID training points per IVF list
+        nlist = index_settings.get("nlist", 1)
+        rows = np.linspace(0, num_vectors - 1,
+                           min(num_vectors, max(sample_size, nlist * MIN_POINTS_PER_CENTROID))).astype(np.int64)
+        index.train(np.ascontiguousarray(vectors[np.unique(rows)]))
+    for start in range(0, num_vectors, ADD_BATCH_SIZE):
+        index.add(np.ascontiguousarray(vectors[start:start + ADD_BATCH_SIZE]))
+    apply_search_params(index, index_settings)
+    return index, index_settings
+
+def apply_search_params(index, index_settings):
+    """Set the search-time knobs (nprobe / efSearch) from a bot's index settings."""
+    if not index_settings:
+        return
+    if "nprobe" in index_settings:
+        faiss.extract_index_ivf(index).nprobe = int(index_settings["nprobe"])
+    if "ef_search" in index_settings and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = int(index_settings["ef_search"])
@@ -1,15 +1,33 @@
 import os
 import json
 import faiss
+import hashlib
 import pickle
+import shutil
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import requests
-from flask import Flask, request, jsonify, send_from_directory, render_template
+from flask import Flask, Response, request, jsonify, send_from_directory, render_template, stream_with_context
 from flask_cors import CORS
-from sentence_transformers import SentenceTransformer
 from werkzeug.utils import secure_filename
 
+from ann_index import INDEX_TYPES, SEARCH_PARAMS, apply_search_params, build_index_from_file
+from caches import SizedLRUCache, TTLCache, normalize_query
+from embedding_batcher import EmbeddingBatcher
+from encoder import LazyEncoder
+from ingestion import iter_file_chunks
+from lexical_index import LexicalIndex, LexicalIndexBuilder
+from llm_client import LLMClient, LLMError, LLMOverloaded
+from metadata_store import MetadataStore, MetadataWriter
+from metrics import StageHistograms, StageTimer, process_rss_bytes, render_prometheus
+import prompt_builder
+from rate_limit import RateLimiter
+from response_cache import RESPONSE_CACHE_DEFAULTS, SemanticResponseCache
+from session_store import MemorySessionStore, SQLiteSessionStore, trim_history
+from shared_state import SQLiteDict, file_lock
+
 app = Flask(__name__)
 CORS(app)
 
@@ -28,17 +46,155 @@ ALLOWED_EXTENSIONS = {"json", "txt", "md", "csv", "pdf"}
 ALLOWED_IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp", "svg"}
 
 # --- Ollama config ---
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
-OLLAMA_MODEL = "llama3.2"
+OLLAMA_API_URL = os.environ.get("OLLAMA_API_URL", "http://localhost:11434/api/chat")  # Comma-separated for several Ollama servers
+OLLAMA_API_URLS = [url.strip() for url in OLLAMA_API_URL.split(",") if url.strip()]
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3.2")
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")  # Keeps the model and its prompt cache loaded
+
+# --- LLM client (limits are per process) ---
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))   # Requests in flight to Ollama
+LLM_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", "64"))              # Requests waiting for a slot; more get a 503
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", "30"))    # Max seconds waiting for a slot
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.environ.get("LLM_READ_TIMEOUT", "300"))    # Max silence while Ollama generates
+LLM_RETRIES = int(os.environ.get("LLM_RETRIES", "2"))                  # Extra attempts on other endpoints
+LLM_MAX_QUEUE_PER_BOT = int(os.environ.get("LLM_MAX_QUEUE_PER_BOT", str(LLM_MAX_QUEUE // 2)))  # One bot's share of the queue
+LLM_CLIENT_SETTINGS = {
+    "max_in_flight": LLM_MAX_CONCURRENCY,
+    "max_queue": LLM_MAX_QUEUE,
+    "queue_timeout": LLM_QUEUE_TIMEOUT,
+    "connect_timeout": LLM_CONNECT_TIMEOUT,
+    "read_timeout": LLM_READ_TIMEOUT,
+    "retries": LLM_RETRIES,
+    "max_queue_per_tenant": LLM_MAX_QUEUE_PER_BOT,
+}
+llm_client = LLMClient(OLLAMA_API_URLS, **LLM_CLIENT_SETTINGS)
+
+# --- Multi-tenant routing (limits are per process) ---
+# Queued LLM calls are shared out between bots by weighted fair queuing; a bot's
+# "priority" (default 1) is its weight, so priority 2 gets twice the share of priority 1.
+# Chat requests can also take a token from a per-bot and a per-session bucket, or get a 429.
+# Per-bot overrides go in the "rate_limit" section of the bot config; a rate of 0 means
+# unlimited, the default for both. Buckets are per worker process, so with N workers a
+# bot or session can get up to N times the configured rate.
+RATE_LIMIT_DEFAULTS = {
+    "bot_rps": float(os.environ.get("BOT_RATE_LIMIT", "0")),            # Chat requests per second per bot
+    "bot_burst": float(os.environ.get("BOT_RATE_BURST", "50")),
+    "session_rps": float(os.environ.get("SESSION_RATE_LIMIT", "0")),    # Chat requests per second per session
+    "session_burst": float(os.environ.get("SESSION_RATE_BURST", "10")),
+}
+rate_limiter = RateLimiter()
+
+# --- Retrieval config ---
+DISTANCE_THRESHOLD = 1.5  # Max L2 distance for context to count as relevant (tune as needed)
+
+# Vector (FAISS) and lexical (BM25) hits are fused with reciprocal rank fusion.
+# Per-bot overrides go in the "retrieval" section of the bot config.
+RETRIEVAL_DEFAULTS = {
+    "top_k": 10,                # Chunks handed to the prompt builder
+    "vector_k": 10,             # FAISS candidates
+    "lexical_k": 10,            # BM25 candidates (0 = vector search only)
+    "rrf_k": 60,                # Reciprocal rank fusion constant
+    "distance_threshold": DISTANCE_THRESHOLD,
+    "min_lexical_coverage": 0.75,  # Share of the query's IDF mass a BM25 hit must contain to count as relevant
+}
+
+# --- Prompt budgets (estimated tokens; per-bot overrides: "context_token_budget" / "prompt_token_budget") ---
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1024"))
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "2048"))  # Fits Ollama's default context window
 
 # --- Embedding model ---
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+# Loaded by the warm-up below or on first use, not at import (see encoder.py for ONNX / quantized exports)
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")  # torch, onnx or openvino
+EMBEDDING_MODEL_FILE = os.environ.get("EMBEDDING_MODEL_FILE")    # e.g. onnx/model_quint8_avx2.onnx
+embedding_model = LazyEncoder('all-MiniLM-L6-v2', EMBEDDING_BACKEND, EMBEDDING_MODEL_FILE)
+
+# Concurrent chat queries are encoded together in one batch
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "32"))
+EMBED_BATCH_WAIT_MS = float(os.environ.get("EMBED_BATCH_WAIT_MS", "5"))
+query_batcher = EmbeddingBatcher(embedding_model, EMBED_BATCH_SIZE, EMBED_BATCH_WAIT_MS)
+
+# --- Query caches ---
+# normalized query -> embedding (shared by all bots, since the model is shared)
+query_embedding_cache = TTLCache(
+    int(os.environ.get("QUERY_CACHE_SIZE", "2048")),
+    float(os.environ.get("QUERY_CACHE_TTL", "3600")),
+)
+# (bot_name, index_path, normalized query) -> (distances, ids) of the top-k search
+retrieval_cache = TTLCache(
+    int(os.environ.get("RETRIEVAL_CACHE_SIZE", "4096")),
+    float(os.environ.get("RETRIEVAL_CACHE_TTL", "600")),
+)
+
+# --- Resident bot indexes ---
+# Indexes load on a bot's first chat and the least recently used ones are
+# dropped past these limits (0 = unbounded). Sizes are the on-disk index +
+# metadata bytes, an upper bound when the index is memory-mapped.
+MAX_RESIDENT_INDEXES = int(os.environ.get("MAX_RESIDENT_INDEXES", "0"))
+MAX_RESIDENT_INDEX_MB = float(os.environ.get("MAX_RESIDENT_INDEX_MB", "0"))
+MMAP_INDEXES = os.environ.get("MMAP_INDEXES", "1") != "0"  # Map index files instead of reading them
+
+# --- Background ingestion ---
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "256"))  # Chunks per encode call
+INGEST_JOB_RETENTION = 3600  # Seconds a finished job's status stays queryable
+ingest_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("INGEST_WORKERS", "1")),
+    thread_name_prefix="ingest",
+)
+
+# --- Multi-process serving ---
+# With SHARED_STATE_DB set (gunicorn.conf.py sets it), chat sessions, themes and
+# ingestion job status live in a SQLite file shared by every worker process.
+# Bot configs are files; writers touch CONFIG_GENERATION_FILE so other workers reload them.
+SHARED_STATE_DB = os.environ.get("SHARED_STATE_DB")
+CONFIG_GENERATION_FILE = os.path.join(BOT_CONFIG_FOLDER, ".generation")
+
+# --- Chat sessions ---
+# History kept per (bot, session), trimmed to a token budget (per-bot override:
+# "history_token_budget" in the bot config) and expired SESSION_TTL seconds after the last answer.
+SESSION_DB = os.environ.get("SESSION_DB", SHARED_STATE_DB)  # SQLite file; in-memory LRU when unset
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", "10000"))
+SESSION_TTL = float(os.environ.get("SESSION_TTL", "3600"))
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "1024"))
+
+# --- Startup warm-up ---
+# The server answers /health right after import; /ready turns 200 once warm-up is done.
+#   background: load the embedding model, then the hot bots' indexes, in a thread (default)
+#   preload:    load the model during import and leave index warm-up to start_warmup()
+#               (gunicorn.conf.py: the model is shared by the forked workers, which each warm their indexes)
+#   off:        load everything on first use
+WARMUP = os.environ.get("WARMUP", "background")
+WARMUP_BOTS = os.environ.get("WARMUP_BOTS", "all")  # "all", "none" or comma-separated bot names
+
+# --- Metrics ---
+# Per-stage chat latency histograms on /metrics. A request sent with
+# "X-Debug-Timing: 1" (or every request, with DEBUG_TIMING=1) also gets its
+# breakdown in a Server-Timing header (and in the last line of a stream).
+DEBUG_TIMING = os.environ.get("DEBUG_TIMING", "0") == "1"
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))  # Seconds between shared snapshots
 
 # --- In-memory stores ---
 bot_configs = {}     # bot_name -> config dict
-chat_histories = {}  # session_id -> list of chat messages
-bot_themes = {}      # bot_name -> theme dict
-cached_indexes = {}  # bot_name -> (faiss_index, metadata_list)
+if SHARED_STATE_DB:
+    bot_themes = SQLiteDict(SHARED_STATE_DB, "bot_themes")       # bot_name -> theme dict
+    shared_jobs = SQLiteDict(SHARED_STATE_DB, "ingestion_jobs")  # job_id -> job status, for other workers
+else:
+    bot_themes = {}      # bot_name -> theme dict
+    shared_jobs = None
+if SESSION_DB:
+    session_store = SQLiteSessionStore(SESSION_DB, SESSION_TTL)
+else:
+    session_store = MemorySessionStore(MAX_SESSIONS, SESSION_TTL)  # (bot_name, session_id) -> chat messages
+cached_indexes = SizedLRUCache(MAX_RESIDENT_INDEXES, MAX_RESIDENT_INDEX_MB * 1024 * 1024)  # bot_name -> (index_path, (faiss_index, MetadataStore, LexicalIndex))
+index_load_lock = threading.Lock()
+response_caches = {} # bot_name -> SemanticResponseCache (opt-in per bot)
+ingestion_jobs = {}  # job_id -> background knowledge base build status
+warmup_state = {"status": "pending", "bots_total": 0, "bots_warmed": 0, "seconds": None, "error": None}
+stage_metrics = StageHistograms(
+    store=SQLiteDict(SHARED_STATE_DB, "worker_metrics") if SHARED_STATE_DB else None,  # Summed over workers
+    flush_interval=METRICS_FLUSH_INTERVAL,
+)
+started_at = time.time()
 
 # --- Default UI theme (updated to include inputTextColor) ---
 DEFAULT_THEME = {
@@ -61,99 +217,426 @@ def allowed_image_file(filename):
     """Check if filename extension is allowed for images."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_IMAGE_EXTENSIONS
 
-import pdfplumber
-
-def process_uploaded_file(filepath):
-    """
-    Extract tabular data from PDFs (employee transfers), or handle JSON fallback.
-    Build embeddings and store index + metadata.
-    """
-    texts = []
-    metadatas = []
-
-    ext = filepath.rsplit('.', 1)[-1].lower()
-
-    if ext == "pdf":
-        with pdfplumber.open(filepath) as pdf:
-            for page in pdf.pages:
-                tables = page.extract_tables()
-                for table in tables:
-                    for row in table:
-                        if any(row):
-                            row_text = " | ".join(cell.strip() if cell else "" for cell in row)
-                            texts.append(row_text)
-                            metadatas.append({
-                                "title": row[0].strip() if row[0] else "Row",
-                                "description": row_text,
-                                "phase": ""
-                            })
-
-    elif ext == "json":
-        with open(filepath, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        if "phases" in data:
-            for phase in data["phases"]:
-                phase_name = phase.get("phase", "")
-                for node in phase.get("nodes", []):
-                    title = node.get("title", "")
-                    desc = node.get("description", "")
-                    full_text = f"{title}: {desc}"
-                    texts.append(full_text)
-                    metadatas.append({
-                        "title": title,
-                        "description": desc,
-                        "phase": phase_name
-                    })
+def chunk_hash(text):
+    """Content hash identifying a chunk across uploads of the same knowledge base."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def new_kb_paths(filepath):
+    """Fresh index / metadata / vector file paths for a knowledge base built from filepath."""
+    base_name = os.path.splitext(os.path.basename(filepath))[0] + "_" + uuid.uuid4().hex
+    return {
+        "index_path": os.path.join(EMBED_FOLDER, f"{base_name}_index.faiss"),
+        "meta_path": os.path.join(EMBED_FOLDER, f"{base_name}_metadata.kbm"),
+        "vectors_path": os.path.join(EMBED_FOLDER, f"{base_name}_vectors.f32"),
+        "lexical_path": os.path.join(EMBED_FOLDER, f"{base_name}_lexical.kbl"),
+    }
+
+def kb_encoder(config):
+    """
+    Identity of the encoder that built a knowledge base's vectors. Knowledge bases
+    from before it was recorded were built with the default torch model.
+    """
+    return config.get("encoder") or {"model": embedding_model.model_name, "backend": "torch", "model_file": None}
+
+def load_chunk_store(config):
+    """
+    Return (chunk hash -> row, vectors) for a bot's current knowledge base.
+    Vectors are memory-mapped and row-aligned with the FAISS ids and metadata.
+    Knowledge bases built before the chunk store existed, or by a different
+    encoder (model, backend or model file), return ({}, None).
+    """
+    vectors_path = (config or {}).get("vectors_path")
+    if not vectors_path or not os.path.exists(vectors_path):
+        return {}, None
+    if kb_encoder(config) != embedding_model.identity():
+        print(f"[INFO] Embedding model changed since the last build ({kb_encoder(config)}); re-embedding every chunk")
+        return {}, None
+    dim = embedding_model.get_sentence_embedding_dimension()
+    vectors = np.memmap(vectors_path, dtype='float32', mode='r').reshape(-1, dim)
+    return MetadataStore(config["meta_path"]).hash_rows(), vectors
+
+def embed_chunks(batch, known, old_vectors, progress):
+    """Vectors for a batch of (text, hash): reused from the chunk store when known, else encoded."""
+    vectors = np.empty((len(batch), embedding_model.get_sentence_embedding_dimension()), dtype='float32')
+    missing = []
+    for i, (text, digest) in enumerate(batch):
+        if digest in known:
+            vectors[i] = old_vectors[known[digest]]
         else:
-            def extract_texts(obj):
-                if isinstance(obj, dict):
-                    for v in obj.values():
-                        extract_texts(v)
-                elif isinstance(obj, list):
-                    for item in obj:
-                        extract_texts(item)
-                elif isinstance(obj, str):
-                    texts.append(obj)
-
-            extract_texts(data)
-            metadatas = [{"title": "", "description": t, "phase": ""} for t in texts]
+            missing.append(i)
+    if missing:
+        vectors[missing] = embedding_model.encode([batch[i][0] for i in missing], show_progress_bar=False)
+
+    progress["chunks_embedded"] = progress.get("chunks_embedded", 0) + len(missing)
+    progress["chunks_reused"] = progress.get("chunks_reused", 0) + len(batch) - len(missing)
+    return vectors
+
+def remove_files(paths):
+    """Delete files, best effort: one that cannot be removed (still mapped on Windows) is logged and skipped."""
+    for path in paths:
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"[WARNING] Failed to remove {path}: {e}")
 
+def process_uploaded_file(filepath, index_type=None, progress=None, previous_config=None):
+    """
+    Stream chunks out of a knowledge base file (see ingestion.py), embed them
+    in batches into the chunk vectors file, then build the index from that
+    file (see ann_index.build_index_from_file) and store index and metadata.
+    Chunks already present in previous_config's knowledge base (same content
+    hash) reuse their stored vector. Without an index_type the bot keeps its
+    current index type, and the same type keeps its search parameters.
+    Returns the knowledge base entries for the bot config.
+    """
+    progress = progress if progress is not None else {}
+    progress["stage"] = "indexing"
+    known, old_vectors = load_chunk_store(previous_config)
+    previous_index = (previous_config or {}).get("index") or {}
+    index_type = index_type or previous_index.get("type", "auto")
+    index_params = None
+    if index_type == previous_index.get("type"):
+        # Tuned search parameters (nprobe / ef_search) carry over while the type stays the same
+        index_params = {key: previous_index[key] for key in SEARCH_PARAMS if key in previous_index}
+    paths = new_kb_paths(filepath)
+    metadatas = MetadataWriter()
+    lexical = LexicalIndexBuilder()
+    batch = []
+
+    try:
+        with open(paths["vectors_path"], "wb") as vectors_file:
+            def embed_batch():
+                embeddings = embed_chunks(batch, known, old_vectors, progress)
+                vectors_file.write(embeddings.tobytes())
+                progress["chunks_indexed"] = len(metadatas)
+                batch.clear()
+
+            for text, metadata in iter_file_chunks(filepath, progress):
+                digest = chunk_hash(text)
+                batch.append((text, digest))
+                metadatas.add(metadata, digest)
+                lexical.add(text)
+                if len(batch) >= INGEST_BATCH_SIZE:
+                    embed_batch()
+            if batch:
+                embed_batch()
+
+        if not len(metadatas):
+            raise ValueError("No textual data extracted")
+
+        # Exact search for small corpora, ANN (HNSW / IVF / IVF-PQ) for large ones
+        index, index_settings = build_index_from_file(
+            paths["vectors_path"], embedding_model.get_sentence_embedding_dimension(), index_type, index_params)
+        print(f"[INFO] Built {index_settings['type']} index with {index.ntotal} vectors "
+              f"({progress.get('chunks_reused', 0)} reused, {progress.get('chunks_embedded', 0)} embedded)")
+
+        progress["stage"] = "saving"
+        faiss.write_index(index, paths["index_path"])
+        metadatas.write(paths["meta_path"])
+        lexical.write(paths["lexical_path"])
+    except Exception:
+        remove_files(paths.values())
+        raise
+
+    return {**paths, "index": index_settings, "encoder": embedding_model.identity()}
+
+def append_to_knowledge_base(bot_name, filepath, progress=None):
+    """
+    Embed the chunks of an extra document and add them to a copy of the bot's
+    index (the live one keeps serving). Chunks already in the knowledge base are skipped.
+    Returns the knowledge base entries for the bot config.
+    """
+    progress = progress if progress is not None else {}
+    progress["stage"] = "indexing"
+    config = bot_configs[bot_name]
+    if "vectors_path" not in config:
+        raise ValueError("This knowledge base was built before incremental updates; re-upload it once first")
+    if kb_encoder(config) != embedding_model.identity():
+        raise ValueError("The embedding model changed since this knowledge base was built; re-upload it once first")
+
+    index = faiss.read_index(config["index_path"])
+    existing = MetadataStore(config["meta_path"])
+    known = set(existing.hash_rows())
+    metadatas = MetadataWriter()
+    metadatas.extend(existing)
+    lexical = LexicalIndexBuilder()
+    if os.path.exists(config.get("lexical_path") or ""):
+        lexical.extend(LexicalIndex(config["lexical_path"]))
     else:
-        raise ValueError("Unsupported file format")
+        # Knowledge base built before lexical search: index its stored snippets
+        for row in range(len(existing)):
+            lexical.add(existing.snippet(row))
+    paths = new_kb_paths(filepath)
+    batch = []
+    added = 0
 
-    if not texts:
-        raise ValueError("No textual data extracted")
+    try:
+        shutil.copyfile(config["vectors_path"], paths["vectors_path"])
+        with open(paths["vectors_path"], "ab") as vectors_file:
+            def embed_batch():
+                embeddings = embed_chunks(batch, {}, None, progress)
+                index.add(embeddings)
+                vectors_file.write(embeddings.tobytes())
+                progress["chunks_indexed"] = added
+                batch.clear()
+
+            for text, metadata in iter_file_chunks(filepath, progress):
+                digest = chunk_hash(text)
+                if digest in known:
+                    continue
+                known.add(digest)
+                batch.append((text, digest))
+                metadatas.add(metadata, digest)
+                lexical.add(text)
+                added += 1
+                if len(batch) >= INGEST_BATCH_SIZE:
+                    embed_batch()
+            if batch:
+                embed_batch()
+
+        if not added:
+            raise ValueError("No new textual data to add")
+        print(f"[INFO] Appended {added} chunks to '{bot_name}' ({index.ntotal} vectors total)")
+
+        progress["stage"] = "saving"
+        faiss.write_index(index, paths["index_path"])
+        metadatas.write(paths["meta_path"])
+        lexical.write(paths["lexical_path"])
+    except Exception:
+        remove_files(paths.values())
+        raise
+
+    return {**paths, "index": config.get("index"), "encoder": kb_encoder(config)}
+
+def kb_files(config):
+    """Every knowledge base file (index, metadata, vectors, uploads) a bot config refers to."""
+    uploads = [config.get("file"), *config.get("appended_files", [])]
+    paths = [config.get(key) for key in ("index_path", "meta_path", "vectors_path", "lexical_path")]
+    paths += [os.path.join(UPLOAD_FOLDER, name) for name in uploads if name]
+    return {path for path in paths if path}
+
+def start_ingestion_job(bot_name, kb_filename, index_type=None, bot_role=None, avatar_filename=None,
+                        response_cache_enabled=None, append=False):
+    """
+    Queue a background build of a bot's knowledge base (or, with append=True,
+    of an extra document added to it) and return the job status dict.
+    """
+    # Forget finished jobs nobody has asked about for a while
+    now = time.time()
+    for job_id in [j for j, job in ingestion_jobs.items()
+                   if job["finished_at"] and now - job["finished_at"] > INGEST_JOB_RETENTION]:
+        ingestion_jobs.pop(job_id, None)
+        if shared_jobs is not None:
+            shared_jobs.pop(job_id, None)
+
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "bot_name": bot_name,
+        "type": "append" if append else "upload",
+        "file": kb_filename,
+        "status": "queued",
+        "progress": {},
+        "error": None,
+        "created_at": now,
+        "finished_at": None,
+    }
+    ingestion_jobs[job["job_id"]] = job
+    publish_job(job)
+    ingest_executor.submit(run_ingestion_job, job, bot_role, index_type, avatar_filename, response_cache_enabled)
+    return job
+
+def publish_job(job):
+    """Make a job's status visible to the other worker processes (multi-worker mode only)."""
+    if shared_jobs is not None:
+        shared_jobs[job["job_id"]] = job
+
+def run_ingestion_job(job, bot_role, index_type, avatar_filename, response_cache_enabled):
+    """Build the new index, then swap the bot over to it (the old one keeps serving until then)."""
+    bot_name = job["bot_name"]
+    kb_filepath = os.path.join(UPLOAD_FOLDER, job["file"])
+    job["status"] = "running"
+    job["progress"]["stage"] = "waiting"
+    publish_job(job)
+    try:
+        # One knowledge base change per bot at a time, across worker processes too, each
+        # starting from the latest saved config (another worker may have just changed it)
+        with bot_update_lock(bot_name):
+            sync_bot_configs()
+            if job["type"] == "append":
+                kb_update = append_to_knowledge_base(bot_name, kb_filepath, job["progress"])
+                current = bot_configs[bot_name]
+                kb_update["appended_files"] = [*current.get("appended_files", []), job["file"]]
+                apply_bot_update(bot_name, current["role"], current.get("avatar"), None, kb_update)
+            else:
+                # Unchanged chunks of the bot's current knowledge base are reused, not re-embedded
+                kb_update = process_uploaded_file(kb_filepath, index_type, job["progress"], bot_configs.get(bot_name))
+                kb_update.update({"file": job["file"], "appended_files": []})
+                apply_bot_update(bot_name, bot_role, avatar_filename, response_cache_enabled, kb_update)
+        job["status"] = "completed"
+    except Exception as e:
+        print(f"[ERROR] Ingestion job {job['job_id']} for '{bot_name}' failed: {e}")
+        job["status"] = "failed"
+        job["error"] = f"Failed to process knowledge base file: {str(e)}"
+
+        # Drop files that were only uploaded for this build
+        try:
+            if os.path.exists(kb_filepath):
+                os.remove(kb_filepath)
+            old_avatar = bot_configs.get(bot_name, {}).get("avatar")
+            if avatar_filename and avatar_filename != old_avatar:
+                avatar_path = os.path.join(BOT_CONFIG_FOLDER, bot_name, avatar_filename)
+                if os.path.exists(avatar_path):
+                    os.remove(avatar_path)
+        except Exception as cleanup_error:
+            print(f"[WARNING] Failed to cleanup files of failed job: {cleanup_error}")
+    job["finished_at"] = time.time()
+    publish_job(job)
+
+def bot_update_lock(bot_name):
+    """Lock serializing knowledge base builds of one bot across threads and worker processes."""
+    return file_lock(os.path.join(BOT_CONFIG_FOLDER, f".{bot_name}.lock"))
+
+def apply_bot_update(bot_name, bot_role, avatar_filename, response_cache_enabled=None, kb_update=None):
+    """
+    Create or update a bot's config, swapping in a rebuilt knowledge base if given,
+    then clean up the files it replaced. Raises if the config cannot be saved.
+    """
+    bot_folder = os.path.join(BOT_CONFIG_FOLDER, bot_name)
+    old_config = bot_configs.get(bot_name)
+
+    # Create/update bot config (keeping settings not managed by the upload form)
+    config = {
+        **(old_config or {}),
+        "role": bot_role,
+        "avatar": avatar_filename,  # This will be None if no avatar
+        **(kb_update or {}),
+    }
 
-    # Embedding logic remains unchanged
-    embeddings = embedding_model.encode(texts, show_progress_bar=False)
-    embeddings = np.array(embeddings).astype('float32')
+    # Opt-in semantic answer cache
+    if response_cache_enabled is not None:
+        config["response_cache"] = {**config.get("response_cache", {}), "enabled": response_cache_enabled}
 
-    index = faiss.IndexFlatL2(embeddings.shape[1])
-    index.add(embeddings)
+    bot_configs[bot_name] = config
 
-    base_name = os.path.splitext(os.path.basename(filepath))[0] + "_" + uuid.uuid4().hex
-    index_path = os.path.join(EMBED_FOLDER, f"{base_name}_index.faiss")
-    meta_path = os.path.join(EMBED_FOLDER, f"{base_name}_metadata.pkl")
+    if kb_update:
+        # Clear cached index so the next chat loads the new one (and the old files can be deleted)
+        release_bot_index(bot_name)
 
-    faiss.write_index(index, index_path)
-    with open(meta_path, "wb") as f:
-        pickle.dump(metadatas, f)
+    # Cached answers depend on the role and cache settings too
+    response_caches.pop(bot_name, None)
+
+    # Cleanup old files if bot exists and we're replacing them
+    if old_config:
+        # Clean up old knowledge base files if we have new ones
+        if kb_update:
+            try:
+                remove_files(kb_files(old_config) - kb_files(config))
+            except Exception as e:
+                print(f"[WARNING] Failed to cleanup old files: {e}")
 
-    return index_path, meta_path
+        # Clean up old avatar if we have a new one
+        old_avatar = old_config.get("avatar")
+        if old_avatar and old_avatar != avatar_filename:
+            old_avatar_path = os.path.join(bot_folder, old_avatar)
+            if os.path.exists(old_avatar_path):
+                try:
+                    os.remove(old_avatar_path)
+                except Exception as e:
+                    print(f"[WARNING] Failed to remove old avatar: {e}")
 
+    # Ensure bot has theme with inputTextColor
+    if bot_name not in bot_themes:
+        bot_themes[bot_name] = DEFAULT_THEME.copy()
+    else:
+        # Ensure existing themes have the new inputTextColor property
+        bot_themes[bot_name] = {**DEFAULT_THEME, **bot_themes[bot_name]}
 
+    # Save bot config to JSON file
+    save_bot_config(bot_name, config)
+    print(f"[INFO] Bot config saved for '{bot_name}': {config}")
 
 def save_bot_config(bot_name, config):
     """Persist bot config to JSON file inside bot's own folder."""
     bot_folder = os.path.join(BOT_CONFIG_FOLDER, bot_name)
     os.makedirs(bot_folder, exist_ok=True)
     path = os.path.join(bot_folder, f"{bot_name}.json")
-    with open(path, "w") as f:
+    # Write then rename, so other worker processes never read a half-written config
+    with open(path + ".tmp", "w") as f:
         json.dump(config, f, indent=2)
+    os.replace(path + ".tmp", path)
+    bump_config_generation()
+
+def bump_config_generation():
+    """Tell the other worker processes that bot configs changed on disk."""
+    with open(CONFIG_GENERATION_FILE, "w") as f:
+        f.write(uuid.uuid4().hex)
+
+def read_bot_config(bot_name):
+    """A bot's saved config, or None if it has none."""
+    json_path = os.path.join(BOT_CONFIG_FOLDER, bot_name, f"{bot_name}.json")
+    if not os.path.exists(json_path):
+        return None
+    with open(json_path, "r") as f:
+        return json.load(f)
+
+config_generation = None  # Last CONFIG_GENERATION_FILE state this process has loaded
+
+def sync_bot_configs():
+    """
+    Reload bot configs changed by another worker process, dropping this process's
+    cached index and retrieval results for those bots. Costs one stat() when nothing changed.
+    """
+    global config_generation
+    try:
+        stat = os.stat(CONFIG_GENERATION_FILE)
+    except FileNotFoundError:
+        return
+    generation = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    if generation == config_generation:
+        return
+    config_generation = generation
+
+    saved = set()
+    for bot_name in os.listdir(BOT_CONFIG_FOLDER):
+        if not os.path.isdir(os.path.join(BOT_CONFIG_FOLDER, bot_name)):
+            continue
+        try:
+            config = read_bot_config(bot_name)
+        except Exception as e:
+            print(f"[WARNING] Failed to reload config for '{bot_name}': {e}")
+            saved.add(bot_name)
+            continue
+        if config is None:
+            continue
+        saved.add(bot_name)
+        if bot_configs.get(bot_name) != config:
+            bot_configs[bot_name] = config
+            cached_indexes.pop(bot_name, None)
+            invalidate_bot_caches(bot_name)
+    for bot_name in set(bot_configs) - saved:
+        bot_configs.pop(bot_name, None)
+        cached_indexes.pop(bot_name, None)
+        invalidate_bot_caches(bot_name)
+
+def migrate_pickle_metadata(bot_name, config):
+    """One-off conversion of a knowledge base's pickled metadata list to a metadata store file."""
+    meta_path = config.get("meta_path") or ""
+    if not meta_path.endswith(".pkl") or not os.path.exists(meta_path):
+        return
+    with open(meta_path, "rb") as f:
+        metadatas = pickle.load(f)
+    writer = MetadataWriter()
+    for metadata in metadatas:
+        writer.add(metadata, metadata.get("hash"))
+    config["meta_path"] = os.path.splitext(meta_path)[0] + ".kbm"
+    writer.write(config["meta_path"])
+    save_bot_config(bot_name, config)
+    os.remove(meta_path)
+    print(f"[INFO] Converted metadata for '{bot_name}' to {config['meta_path']}")
 
 def load_all_bots():
-    """Load all saved bot configs from subfolders and preload indexes."""
+    """Load all saved bot configs from subfolders (indexes load on first chat)."""
     for bot_name in os.listdir(BOT_CONFIG_FOLDER):
         bot_folder = os.path.join(BOT_CONFIG_FOLDER, bot_name)
         if os.path.isdir(bot_folder):
@@ -165,13 +648,51 @@ def load_all_bots():
                     # Ensure theme has all required properties including inputTextColor
                     bot_themes[bot_name] = {**DEFAULT_THEME, **bot_themes.get(bot_name, {})}
                     try:
-                        index = faiss.read_index(config["index_path"])
-                        with open(config["meta_path"], "rb") as mf:
-                            metadata = pickle.load(mf)
-                        cached_indexes[bot_name] = (index, metadata)
-                        print(f"[INFO] Loaded bot '{bot_name}' with avatar: {config.get('avatar')}")
+                        migrate_pickle_metadata(bot_name, config)
                     except Exception as e:
-                        print(f"[ERROR] Failed to load FAISS index or metadata for '{bot_name}': {e}")
+                        print(f"[ERROR] Failed to convert metadata for '{bot_name}': {e}")
+                    if not os.path.exists(config.get("index_path", "")):
+                        print(f"[WARNING] Index file missing for '{bot_name}': {config.get('index_path')}")
+                    print(f"[INFO] Loaded bot '{bot_name}' with avatar: {config.get('avatar')}")
+
+def warmup_bot_names():
+    """Bots whose indexes warm-up loads: WARMUP_BOTS, minus bots with "warmup": false in their config."""
+    if WARMUP_BOTS == "none":
+        return []
+    names = list(bot_configs) if WARMUP_BOTS == "all" else [name.strip() for name in WARMUP_BOTS.split(",")]
+    names = [name for name in names if name in bot_configs and bot_configs[name].get("warmup", True)]
+    # Loading more than fit would only evict each other
+    return names[:MAX_RESIDENT_INDEXES] if MAX_RESIDENT_INDEXES else names
+
+def warm_up(load_model=True):
+    """Load the embedding model and the hot bots' indexes, recording progress in warmup_state."""
+    start = time.perf_counter()
+    try:
+        if load_model:
+            # The first encode also initializes the model's kernels
+            embedding_model.encode(["warm up"], show_progress_bar=False)
+        names = warmup_bot_names()
+        warmup_state["bots_total"] = len(names)
+        for bot_name in names:
+            try:
+                index, _, _ = get_bot_index(bot_name)
+                # Page the vectors in now rather than during the bot's first chat
+                index.search(np.zeros((1, index.d), dtype='float32'), 1)
+            except Exception as e:
+                print(f"[WARNING] Failed to warm up '{bot_name}': {e}")
+            warmup_state["bots_warmed"] += 1
+        warmup_state["status"] = "ready"
+    except Exception as e:
+        warmup_state.update(status="failed", error=str(e))
+        print(f"[ERROR] Warm-up failed: {e}")
+    warmup_state["seconds"] = round(time.perf_counter() - start, 3)
+    print(f"[INFO] Warm-up {warmup_state['status']} in {warmup_state['seconds']:.2f}s "
+          f"({warmup_state['bots_warmed']}/{warmup_state['bots_total']} bot indexes)")
+
+def start_warmup(load_model=True):
+    """Run warm_up() in a background thread; /ready reports 503 until it is done."""
+    warmup_state.update(status="running", bots_total=0, bots_warmed=0, seconds=None, error=None)
+    threading.Thread(target=warm_up, args=(load_model,), name="warmup", daemon=True).start()
 
 @app.route("/admin/upload", methods=["POST"])
 def upload_file():
@@ -191,35 +712,24 @@ def upload_file():
     
     # Handle knowledge base file (required for new bots)
     kb_file = request.files.get("file")
-    index_path = None
-    meta_path = None
-    kb_filename = None
-    
-    # If this is an existing bot and no new file is provided, keep the old file info
-    if bot_name in bot_configs and (not kb_file or kb_file.filename == ""):
-        # Use existing knowledge base info
-        existing_config = bot_configs[bot_name]
-        index_path = existing_config["index_path"]
-        meta_path = existing_config["meta_path"]
-        kb_filename = existing_config["file"]
-    else:
-        # New file is required
-        if not kb_file or kb_file.filename == "":
-            return jsonify({"error": "Knowledge base file is required"}), 400
-        
-        if not allowed_file(kb_file.filename):
-            return jsonify({"error": "Knowledge base file type not allowed"}), 400
-        
-        # Save knowledge base file
-        kb_filename = f"{uuid.uuid4().hex}_{secure_filename(kb_file.filename)}"
-        kb_filepath = os.path.join(UPLOAD_FOLDER, kb_filename)
-        kb_file.save(kb_filepath)
-        
-        # Process knowledge base file (index + metadata)
-        try:
-            index_path, meta_path = process_uploaded_file(kb_filepath)
-        except Exception as e:
-            return jsonify({"error": f"Failed to process knowledge base file: {str(e)}"}), 400
+    has_new_kb = bool(kb_file and kb_file.filename != "")
+
+    # None keeps an existing bot's index type and search parameters (see process_uploaded_file)
+    index_type = request.form.get("index_type", "").strip().lower() or None
+    if index_type not in (None, "auto", *INDEX_TYPES):
+        return jsonify({"error": f"index_type must be one of: auto, {', '.join(INDEX_TYPES)}"}), 400
+
+    # An existing bot can be updated without a new file (keeps the old knowledge base)
+    if bot_name not in bot_configs and not has_new_kb:
+        return jsonify({"error": "Knowledge base file is required"}), 400
+
+    if has_new_kb and not allowed_file(kb_file.filename):
+        return jsonify({"error": "Knowledge base file type not allowed"}), 400
+
+    # Opt-in semantic answer cache (None = leave the current setting alone)
+    response_cache_enabled = None
+    if "response_cache" in request.form:
+        response_cache_enabled = request.form.get("response_cache", "").lower() in ("on", "true", "1")
     
     # Handle avatar file (optional)
     avatar_file = request.files.get("bot_avatar")  # Note: using "bot_avatar" as per HTML form
@@ -244,64 +754,61 @@ def upload_file():
         # Keep existing avatar if updating bot
         if bot_name in bot_configs:
             avatar_filename = bot_configs[bot_name].get("avatar")
-    
-    # Cleanup old files if bot exists and we're replacing them
-    if bot_name in bot_configs:
-        old_config = bot_configs[bot_name]
-        
-        # Clean up old knowledge base files if we have new ones
-        if kb_file and kb_file.filename != "":
-            try:
-                if os.path.exists(old_config["index_path"]):
-                    os.remove(old_config["index_path"])
-                if os.path.exists(old_config["meta_path"]):
-                    os.remove(old_config["meta_path"])
-                old_file_path = os.path.join(UPLOAD_FOLDER, old_config["file"])
-                if os.path.exists(old_file_path):
-                    os.remove(old_file_path)
-            except Exception as e:
-                print(f"[WARNING] Failed to cleanup old files: {e}")
-        
-        # Clean up old avatar if we have a new one
-        if avatar_file and avatar_file.filename != "":
-            old_avatar = old_config.get("avatar")
-            if old_avatar:
-                old_avatar_path = os.path.join(bot_folder, old_avatar)
-                if os.path.exists(old_avatar_path) and old_avatar != avatar_filename:
-                    try:
-                        os.remove(old_avatar_path)
-                    except Exception as e:
-                        print(f"[WARNING] Failed to remove old avatar: {e}")
-        
-        # Clear cached index
-        cached_indexes.pop(bot_name, None)
-    
-    # Create/update bot config
-    bot_configs[bot_name] = {
-        "role": bot_role,
-        "file": kb_filename,
-        "index_path": index_path,
-        "meta_path": meta_path,
-        "avatar": avatar_filename  # This will be None if no avatar
-    }
-    
-    # Ensure bot has theme with inputTextColor
-    if bot_name not in bot_themes:
-        bot_themes[bot_name] = DEFAULT_THEME.copy()
-    else:
-        # Ensure existing themes have the new inputTextColor property
-        bot_themes[bot_name] = {**DEFAULT_THEME, **bot_themes[bot_name]}
-    
-    # Save bot config to JSON file
+
+    if has_new_kb:
+        # Save knowledge base file
+        kb_filename = f"{uuid.uuid4().hex}_{secure_filename(kb_file.filename)}"
+        kb_file.save(os.path.join(UPLOAD_FOLDER, kb_filename))
+
+        # Index it in the background; the bot switches over once the build completes
+        job = start_ingestion_job(bot_name, kb_filename, index_type, bot_role, avatar_filename, response_cache_enabled)
+        return jsonify({
+            "message": f"Knowledge base for '{bot_name}' is being indexed.",
+            "job_id": job["job_id"],
+            "status_url": f"/admin/jobs/{job['job_id']}",
+        }), 202
+
     try:
-        save_bot_config(bot_name, bot_configs[bot_name])
-        print(f"[INFO] Bot config saved for '{bot_name}': {bot_configs[bot_name]}")
+        apply_bot_update(bot_name, bot_role, avatar_filename, response_cache_enabled)
     except Exception as e:
         print(f"[ERROR] Failed to save bot config: {e}")
         return jsonify({"error": f"Failed to save bot config: {str(e)}"}), 500
     
     return jsonify({"message": f"Bot '{bot_name}' uploaded and ready."})
 
+@app.route("/admin/append/<bot_name>", methods=["POST"])
+def append_file(bot_name):
+    """Add a document to an existing bot's knowledge base without re-uploading the rest."""
+    if bot_name not in bot_configs:
+        return jsonify({"error": "Bot not found"}), 404
+
+    kb_file = request.files.get("file")
+    if not kb_file or kb_file.filename == "":
+        return jsonify({"error": "A file to append is required"}), 400
+    if not allowed_file(kb_file.filename):
+        return jsonify({"error": "Knowledge base file type not allowed"}), 400
+
+    kb_filename = f"{uuid.uuid4().hex}_{secure_filename(kb_file.filename)}"
+    kb_file.save(os.path.join(UPLOAD_FOLDER, kb_filename))
+
+    job = start_ingestion_job(bot_name, kb_filename, append=True)
+    return jsonify({
+        "message": f"Adding '{kb_file.filename}' to '{bot_name}'.",
+        "job_id": job["job_id"],
+        "status_url": f"/admin/jobs/{job['job_id']}",
+    }), 202
+
+@app.route("/admin/jobs/<job_id>", methods=["GET"])
+def ingestion_job_status(job_id):
+    """Status and progress of a background knowledge base build."""
+    job = ingestion_jobs.get(job_id)
+    if job is None and shared_jobs is not None:
+        # Started by another worker process
+        job = shared_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
 @app.route("/bot/<bot_name>/avatar")
 def get_bot_avatar(bot_name):
     """Serve bot avatar image"""
@@ -327,6 +834,367 @@ def get_bot_avatar(bot_name):
     else:
         return "No avatar available", 404
 
+# --- Chat pipeline (shared by the Flask routes and the async server) ---
+def read_index_file(index_path):
+    """
+    Read a FAISS index, memory-mapping it where FAISS supports it so vector
+    data is paged in from the OS page cache instead of copied onto the heap.
+    Flat and IVF indexes map; HNSW graphs are always read into memory.
+    """
+    if MMAP_INDEXES:
+        for flags in (faiss.IO_FLAG_MMAP_IFC, faiss.IO_FLAG_MMAP):
+            try:
+                return faiss.read_index(index_path, flags)
+            except RuntimeError:
+                continue
+    return faiss.read_index(index_path)
+
+def get_bot_index(bot_name, timer=None):
+    """
+    Return (faiss_index, MetadataStore, LexicalIndex) for a bot, loading it on first use.
+    The lexical index is None for knowledge bases built before lexical search existed.
+    """
+    return bot_index_entry(bot_name, timer)[1]
+
+def cached_bot_index(bot_name):
+    """The cached (index_path, entry) of a bot, or None if missing or loaded from a replaced index."""
+    cached = cached_indexes.get(bot_name)
+    config = bot_configs.get(bot_name)
+    if cached is None or config is None or cached[0] != config["index_path"]:
+        return None
+    return cached
+
+def bot_index_entry(bot_name, timer=None):
+    """
+    get_bot_index() plus the index path the entry was loaded from. A load that
+    raced with a knowledge base swap is cached under the old path, so it is
+    never served once the config points at the new files.
+    """
+    cached = cached_bot_index(bot_name)
+    if cached is not None:
+        return cached
+    with index_load_lock:
+        # Another request may have loaded it while we waited
+        cached = cached_bot_index(bot_name)
+        if cached is not None:
+            return cached
+        start = time.perf_counter()
+        while True:
+            config = bot_configs[bot_name]
+            try:
+                index = read_index_file(config["index_path"])
+                apply_search_params(index, config.get("index"))
+                metadata = MetadataStore(config["meta_path"])
+                size = os.path.getsize(config["index_path"]) + os.path.getsize(config["meta_path"])
+                lexical = None
+                if os.path.exists(config.get("lexical_path") or ""):
+                    lexical = LexicalIndex(config["lexical_path"])
+                    size += os.path.getsize(config["lexical_path"])
+                break
+            except Exception:
+                # The files were replaced (and the old ones deleted) while loading: load the new ones
+                if bot_configs.get(bot_name, config)["index_path"] == config["index_path"]:
+                    raise
+        cached = (config["index_path"], (index, metadata, lexical))
+        cached_indexes.put(bot_name, cached, size)
+        elapsed = time.perf_counter() - start
+        if timer is not None:
+            timer.record("index_load", elapsed)
+        print(f"[INFO] Loaded index for '{bot_name}' ({size / 1e6:.1f} MB) in {elapsed:.2f}s")
+        return cached
+
+def release_bot_index(bot_name):
+    """
+    Drop a bot's cached index and retrieval results before its files are replaced or
+    deleted: the files are memory-mapped, and Windows cannot delete a mapped file.
+    Waits for a load in progress, so that it cannot cache the old files afterwards.
+    """
+    with index_load_lock:
+        cached_indexes.pop(bot_name, None)
+    invalidate_bot_caches(bot_name)
+
+def invalidate_bot_caches(bot_name):
+    """Forget cached retrieval results for a bot whose index was replaced or deleted."""
+    retrieval_cache.discard_where(lambda key: key[0] == bot_name)
+    response_caches.pop(bot_name, None)
+
+def embed_query(user_query):
+    """Return the query embedding, from cache when the same question was seen recently."""
+    key = normalize_query(user_query)
+    vector = query_embedding_cache.get(key)
+    if vector is None:
+        # Batched with other in-flight requests
+        vector = query_batcher.encode(user_query)
+        query_embedding_cache.set(key, vector)
+    return vector
+
+def get_response_cache(bot_name):
+    """Return the bot's semantic answer cache, or None if the bot has not opted in."""
+    settings = {**RESPONSE_CACHE_DEFAULTS, **bot_configs[bot_name].get("response_cache", {})}
+    if not settings["enabled"]:
+        return None
+    if bot_name not in response_caches:
+        response_caches[bot_name] = SemanticResponseCache(
+            embedding_model.get_sentence_embedding_dimension(),
+            settings["threshold"],
+            settings["max_entries"],
+            settings["ttl_seconds"],
+        )
+    return response_caches[bot_name]
+
+def lookup_cached_answer(bot_name, user_query, context_ids, first_turn):
+    """Return a cached answer to a semantically repeated question, if there is one."""
+    cache = get_response_cache(bot_name)
+    # Only first turns are cacheable: later answers depend on the conversation
+    if cache is None or not first_turn:
+        return None
+    return cache.lookup(embed_query(user_query), context_ids)
+
+def remember_answer(bot_name, user_query, context_ids, first_turn, response_text):
+    """Store a first-turn LLM answer in the bot's answer cache (errors are never cached)."""
+    cache = get_response_cache(bot_name)
+    if cache is None or not first_turn or response_text.startswith("❌"):
+        return
+    cache.store(embed_query(user_query), context_ids, response_text)
+
+def retrieval_settings(bot_name):
+    """RETRIEVAL_DEFAULTS overridden by the "retrieval" section of the bot's config."""
+    return {**RETRIEVAL_DEFAULTS, **bot_configs[bot_name].get("retrieval", {})}
+
+def bot_priority(bot_name):
+    """The bot's weight in the fair queuing of LLM calls ("priority" in its config, default 1)."""
+    return float(bot_configs.get(bot_name, {}).get("priority", 1))
+
+def check_rate_limit(bot_name, session_id):
+    """Take a token from the bot's and the session's buckets; returns 0, or the seconds to wait for one."""
+    settings = {**RATE_LIMIT_DEFAULTS, **bot_configs[bot_name].get("rate_limit", {})}
+    return rate_limiter.acquire([
+        (bot_name, settings["bot_rps"], settings["bot_burst"]),
+        ((bot_name, session_id), settings["session_rps"], settings["session_burst"]),
+    ], label=bot_name)
+
+def fuse_ranked(ranked_lists, rrf_k, top_k):
+    """Reciprocal rank fusion: score each id by sum(1 / (rrf_k + rank)) over the lists it appears in."""
+    scores = {}
+    for ids in ranked_lists:
+        for rank, idx in enumerate(ids, start=1):
+            scores[idx] = scores.get(idx, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)[:top_k]
+
+def retrieve_context(bot_name, user_query, timer=None):
+    """
+    Embed the query, search the bot's vector and lexical indexes and fuse the results.
+    Returns (closest_distance, kb_chunks, context_ids), chunks in relevance order;
+    kb_chunks is empty when neither search found anything relevant enough.
+    Stage times are recorded on `timer` if given.
+    """
+    timer = timer or StageTimer()
+    index_path, (index, metadata, lexical) = bot_index_entry(bot_name, timer)
+    settings = retrieval_settings(bot_name)
+
+    # Keyed on the path the index was loaded from, which changes on every upload,
+    # so results from a replaced index can never match
+    cache_key = (bot_name, index_path, normalize_query(user_query))
+    hits = retrieval_cache.get(cache_key)
+    if hits is None:
+        with timer.stage("embed"):
+            query_vector = embed_query(user_query).reshape(1, -1)
+        with timer.stage("vector_search"):
+            D, I = index.search(query_vector, int(settings["vector_k"]))
+        closest_distance = float(D[0][0]) if len(D[0]) else float("inf")
+        vector_ids = [int(idx) for idx in I[0] if 0 <= idx < len(metadata)]
+        relevant = closest_distance <= settings["distance_threshold"]
+
+        ranked_lists = [vector_ids]
+        if lexical is not None and int(settings["lexical_k"]) > 0:
+            # Exact terms (codes, amounts, emails) the embedding may have blurred
+            with timer.stage("lexical_search"):
+                lexical_ids, _, coverage = lexical.search(user_query, int(settings["lexical_k"]))
+            ranked_lists.append([int(idx) for idx in lexical_ids if idx < len(metadata)])
+            relevant = relevant or bool((coverage >= settings["min_lexical_coverage"]).any())
+
+        hits = (closest_distance, fuse_ranked(ranked_lists, settings["rrf_k"], int(settings["top_k"])), relevant)
+        retrieval_cache.set(cache_key, hits)
+
+    closest_distance, ids, relevant = hits
+    if not relevant:
+        return closest_distance, [], ()
+
+    # Build knowledge base context from the snippets rendered at ingest time
+    retrieved_texts = [metadata.snippet(idx) for idx in ids]
+    return closest_distance, retrieved_texts, tuple(ids)
+
+def low_confidence_response(role, closest_distance):
+    """Answer returned when no knowledge base entry is close enough to the query."""
+    return (
+        f"🤖 I'm not confident about that based on the current knowledge base.\n"
+        f"(Closest match distance: {closest_distance:.2f})\n"
+        f"Please try rephrasing or ask something related to: {role}."
+    )
+
+def history_token_budget(bot_name):
+    return int(bot_configs.get(bot_name, {}).get("history_token_budget", HISTORY_TOKEN_BUDGET))
+
+def prepare_history(bot_name, session_id, user_query):
+    """
+    Append the user query to the session history and trim it to the bot's token budget.
+    Returns (history, first_turn); first_turn is decided before trimming, which can
+    leave a follow-up with only its own query.
+    """
+    history = session_store.get(bot_name, session_id)
+    first_turn = not history
+    history.append({"role": "user", "content": user_query})
+    return trim_history(history, history_token_budget(bot_name)), first_turn
+
+def save_history(bot_name, session_id, history, response_text):
+    """Append the assistant response to the session history and store it."""
+    history.append({"role": "assistant", "content": response_text})
+    session_store.save(bot_name, session_id, trim_history(history, history_token_budget(bot_name)))
+
+def build_messages(bot_name, kb_chunks, history, user_query):
+    """Chat messages for the LLM within the bot's token budgets; logs the prompt size."""
+    config = bot_configs[bot_name]
+    messages, stats = prompt_builder.build_messages(
+        config["role"], kb_chunks, history, user_query,
+        int(config.get("context_token_budget", CONTEXT_TOKEN_BUDGET)),
+        int(config.get("prompt_token_budget", PROMPT_TOKEN_BUDGET)),
+    )
+    print(f"[INFO] Prompt for '{bot_name}': {stats['prompt_tokens']} tokens "
+          f"(stable system prefix {stats['system_tokens']}; context {stats['context_tokens']} from {stats['chunks']} chunks, {stats['duplicates']} duplicates; "
+          f"history {stats['history_tokens']} in {stats['history_messages']} messages)")
+    if kb_chunks and not stats["context_tokens"]:
+        # Retrieval found context but none of it fits: the answer degrades to the no-context path
+        print(f"[WARNING] No knowledge base context fits the prompt for '{bot_name}': "
+              f"{stats['context_budget']} tokens left for context after the system prompt and query; "
+              f"raise its prompt_token_budget / context_token_budget")
+    return messages
+
+def ollama_payload(messages, stream):
+    """Request body for Ollama's chat API."""
+    return {
+        "model": OLLAMA_MODEL,
+        "messages": messages,
+        "stream": stream,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {
+            "num_gpu": 0  # Force CPU usage
+        }}
+
+def ndjson_line(obj):
+    """Serialize one streamed chunk as a line of newline-delimited JSON."""
+    return json.dumps(obj) + "\n"
+
+def generate_ollama(messages, bot_name):
+    """
+    Return the full Ollama reply to a chat (errors are returned as text).
+    Raises LLMOverloaded when too many LLM requests are queued.
+    """
+    try:
+        response_json = llm_client.chat(ollama_payload(messages, False), bot_name, bot_priority(bot_name))
+        return response_json.get("message", {}).get("content", "Sorry, no response from model.")
+    except LLMOverloaded:
+        raise
+    except LLMError as e:
+        return f"❌ {str(e)}"
+
+def stream_ollama(messages, bot_name):
+    """
+    Start an Ollama chat stream and return an iterator over its tokens.
+    Raises LLMOverloaded, before anything is sent to the client, when too many LLM requests are queued.
+    """
+    try:
+        chunks = llm_client.stream_chat(ollama_payload(messages, True), bot_name, bot_priority(bot_name))
+    except LLMOverloaded:
+        raise
+    except LLMError as e:
+        return iter([f"❌ {str(e)}"])
+    return ollama_tokens(chunks)
+
+def ollama_tokens(chunks):
+    """Response tokens of a streamed Ollama chat (errors are yielded as text)."""
+    try:
+        for chunk in chunks:
+            token = chunk.get("message", {}).get("content", "")
+            if token:
+                yield token
+            if chunk.get("done"):
+                break
+    except LLMError as e:
+        yield f"❌ {str(e)}"
+    finally:
+        chunks.close()
+
+def overloaded_response():
+    """503 returned when the LLM queue is full, so clients back off instead of piling up."""
+    resp = jsonify({"error": "The model is busy, please retry shortly."})
+    resp.headers["Retry-After"] = "5"
+    return resp, 503
+
+def rate_limited_response(retry_after):
+    """429 returned when the bot's or the session's request bucket is empty."""
+    resp = jsonify({"error": "Too many requests, please slow down."})
+    resp.headers["Retry-After"] = str(int(retry_after) + 1)
+    return resp, 429
+
+def debug_timing_requested(headers):
+    return DEBUG_TIMING or headers.get("X-Debug-Timing") == "1"
+
+def timing_headers(timer, debug_timing):
+    """Server-Timing header with the stages timed so far, when the client asked for it."""
+    return {"Server-Timing": timer.server_timing()} if debug_timing else {}
+
+def timed_ndjson_line(timer, obj):
+    with timer.stage("serialize"):
+        return ndjson_line(obj)
+
+def stream_done_line(timer, response_text, debug_timing):
+    """Last line of a streamed answer. Finishes the request's timer and includes its breakdown when debugging."""
+    timer.finish()
+    done = {"done": True, "response": response_text}
+    if debug_timing:
+        done["timings"] = timer.breakdown()
+    return ndjson_line(done)
+
+def metrics_text(llm):
+    """
+    /metrics body: stage histograms (summed over workers) plus gauges and counters
+    of this process's index cache, query caches and LLM client `llm`.
+    """
+    llm_stats = llm.stats()
+    caches = {"query_embedding": query_embedding_cache.stats(), "retrieval": retrieval_cache.stats()}
+    return render_prometheus(stage_metrics.merged(), metrics=[
+        ("chatbot_resident_indexes", "gauge", "Bot indexes loaded in this process.",
+         [({}, cached_indexes.stats()["resident"])]),
+        ("chatbot_resident_index_bytes", "gauge", "On-disk size of each bot index loaded in this process.",
+         [({"bot": name}, size) for name, size in cached_indexes.sizes().items()]),
+        ("chatbot_cache_hits_total", "counter", "Query cache hits in this process.",
+         [({"cache": name}, stats["hits"]) for name, stats in caches.items()]),
+        ("chatbot_cache_misses_total", "counter", "Query cache misses in this process.",
+         [({"cache": name}, stats["misses"]) for name, stats in caches.items()]),
+        ("chatbot_llm_in_flight", "gauge", "LLM requests running in this process.", [({}, llm_stats["in_flight"])]),
+        ("chatbot_llm_queued", "gauge", "LLM requests waiting for a slot in this process.", [({}, llm_stats["queued"])]),
+        ("chatbot_llm_shed_total", "counter", "LLM requests rejected with 503 by this process.", [({}, llm_stats["shed"])]),
+        ("chatbot_llm_queued_by_bot", "gauge", "LLM requests of each bot waiting for a slot in this process.",
+         [({"bot": name}, count) for name, count in llm_stats["queued_by_tenant"].items()]),
+        ("chatbot_rate_limited_total", "counter", "Chat requests rejected with 429 by this process.",
+         [({"bot": name}, count) for name, count in rate_limiter.stats()["limited"].items()]),
+        ("chatbot_process_resident_bytes", "gauge", "Resident memory of this process.", [({}, process_rss_bytes())]),
+    ])
+
+def health_status():
+    """Liveness plus what this process has loaded: model, bot indexes (with their size) and query cache stats."""
+    return {
+        "status": "ok",
+        "pid": os.getpid(),
+        "uptime_seconds": round(time.time() - started_at, 1),
+        "bots": len(bot_configs),
+        "memory": {"rss_bytes": process_rss_bytes()},
+        "warmup": warmup_state,
+        "embedding_model": embedding_model.stats(),
+        "indexes": {**cached_indexes.stats(), "bots": cached_indexes.sizes()},
+        "caches": {"query_embedding": query_embedding_cache.stats(), "retrieval": retrieval_cache.stats()},
+    }
+
 @app.route("/chat/<bot_name>", methods=["POST"])
 def chat(bot_name):
     if bot_name not in bot_configs:
@@ -335,128 +1203,80 @@ def chat(bot_name):
     data = request.get_json(force=True)
     user_query = data.get("query", "").strip()
     session_id = data.get("session_id", "").strip()
+    stream = bool(data.get("stream", False))
 
     if not user_query or not session_id:
         return jsonify({"error": "Both 'query' and 'session_id' are required."}), 400
 
-    config = bot_configs[bot_name]
-    role = config["role"]
-
-    # Load or get cached faiss index and metadata
-    if bot_name not in cached_indexes:
-        try:
-            index = faiss.read_index(config["index_path"])
-            with open(config["meta_path"], "rb") as f:
-                metadata = pickle.load(f)
-            cached_indexes[bot_name] = (index, metadata)
-        except Exception as e:
-            return jsonify({"error": f"Failed to load index or metadata: {str(e)}"}), 500
-    else:
-        index, metadata = cached_indexes[bot_name]
+    retry_after = check_rate_limit(bot_name, session_id)
+    if retry_after:
+        return rate_limited_response(retry_after)
 
-    # Embed query
-    query_vector = embedding_model.encode([user_query])
-    query_vector = np.array(query_vector).astype('float32')
+    role = bot_configs[bot_name]["role"]
+    timer = StageTimer(stage_metrics, bot_name)
+    debug_timing = debug_timing_requested(request.headers)
 
-    # Search for top 10 closest entries
-    D, I = index.search(query_vector, 10)
-
-    # Distance threshold to decide if context is relevant enough (tune as needed)
-    DISTANCE_THRESHOLD = 1.5
-    closest_distance = D[0][0]
+    try:
+        closest_distance, kb_chunks, context_ids = retrieve_context(bot_name, user_query, timer)
+    except Exception as e:
+        return jsonify({"error": f"Failed to load index or metadata: {str(e)}"}), 500
 
-    if closest_distance > DISTANCE_THRESHOLD:
-        response_text = (
-            f"🤖 I'm not confident about that based on the current knowledge base.\n"
-            f"(Closest match distance: {closest_distance:.2f})\n"
-            f"Please try rephrasing or ask something related to: {role}."
-        )
+    # Neither the vector nor the lexical search found relevant enough context
+    if not kb_chunks:
+        response_text = low_confidence_response(role, closest_distance)
     else:
-        # Build knowledge base context from metadata
-        retrieved_texts = []
-        for idx in I[0]:
-            if 0 <= idx < len(metadata):
-                md = metadata[idx]
-                # Include phase if present
-                phase = f" (Phase: {md.get('phase')})" if md.get('phase') else ""
-                title = md.get("title", "").strip()
-                desc = md.get("description", "").strip()
-                entry_text = f"{title}{phase}: {desc}" if title else desc
-                retrieved_texts.append(entry_text)
-
-        kb_context = "\n".join(retrieved_texts)
-
-        # Retrieve or init chat history for session
-        history = chat_histories.get(session_id, [])
-        history.append({"role": "user", "content": user_query})
-        # Keep last 4 messages max (user + assistant)
-        if len(history) > 8:
-            history = history[-8:]
-
-        # Format conversation history text for prompt
-        history_text = "\n".join([f"{m['role'].capitalize()}: {m['content']}" for m in history])
-
-        prompt = f"""
-You are a smart, friendly, and unisex digital assistant. You're always helpful, respectful, and clear — like a real human guide.
-
-You specialize in this area: {role}
-
-Use ONLY the information from the knowledge base below to answer the user's query. If something is missing or unclear, say so politely and offer to help further.
-
-Speak in a natural, kind, and warm tone — not robotic or overly formal. Be conversational.
-
-Make sure to:
-- Greet the user warmly and acknowledge their query.
-- Give complete, accurate, and contextually relevant answers based on the knowledge base.
-- Never confuse things like emails and URLs — explain them correctly.
-- Avoid guessing. If something is unclear, say so and suggest a next step.
-- If the context is incomplete, ask helpful follow-up questions such as:
-  • "Would you like me to explain more about that?"
-  • "Are you looking for eligibility details, steps, or deadlines?"
-  • "Do you want a direct link or a summarized overview?"
-
-Remember:
-→ If you cannot find the answer in the knowledge base, say: "I'm not fully sure based on the available info. Would you like me to guide you another way?"
-
----
-Knowledge Base:
-{kb_context}
----
-Conversation History:
-{history_text}
----
-User Query:
-{user_query}
----
-
-Now respond to the user naturally and helpfully — like a smart assistant who cares about solving their problem.
-"""
-
-        try:
-            resp = requests.post(
-                OLLAMA_API_URL,
-                json={
-                "model": OLLAMA_MODEL,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "num_gpu": 0  # Force CPU usage
-                }},
-            )
-
-            if resp.status_code == 200:
-                response_json = resp.json()
-                response_text = response_json.get("response", "Sorry, no response from model.")
-            else:
-                response_text = f"❌ Ollama error {resp.status_code}: {resp.text}"
-        except Exception as e:
-            response_text = f"❌ Ollama connection failed: {str(e)}"
-
-        # Append assistant response to history and save
-        history.append({"role": "assistant", "content": response_text})
-        chat_histories[session_id] = history
-
-    return jsonify({"response": response_text})
+        history, first_turn = prepare_history(bot_name, session_id, user_query)
+        with timer.stage("answer_cache"):
+            response_text = lookup_cached_answer(bot_name, user_query, context_ids, first_turn)
+
+        if response_text is None and stream:
+            with timer.stage("prompt_build"):
+                messages = build_messages(bot_name, kb_chunks, history, user_query)
+            llm_start = time.perf_counter()
+            try:
+                token_stream = stream_ollama(messages, bot_name)
+            except LLMOverloaded:
+                return overloaded_response()
+            headers = timing_headers(timer, debug_timing)  # Stages before the LLM; the rest ends the stream
+
+            def generate():
+                tokens = []
+                for token in token_stream:
+                    if not tokens:
+                        timer.record("llm_first_token", time.perf_counter() - llm_start)
+                    tokens.append(token)
+                    yield timed_ndjson_line(timer, {"token": token})
+                timer.record("llm_total", time.perf_counter() - llm_start)
+                response_text = "".join(tokens)
+
+                # Save history once the stream has finished
+                remember_answer(bot_name, user_query, context_ids, first_turn, response_text)
+                save_history(bot_name, session_id, history, response_text)
+                yield stream_done_line(timer, response_text, debug_timing)
+
+            return Response(stream_with_context(generate()), mimetype="application/x-ndjson", headers=headers)
+
+        if response_text is None:
+            with timer.stage("prompt_build"):
+                messages = build_messages(bot_name, kb_chunks, history, user_query)
+            try:
+                with timer.stage("llm_total"):
+                    response_text = generate_ollama(messages, bot_name)
+            except LLMOverloaded:
+                return overloaded_response()
+            remember_answer(bot_name, user_query, context_ids, first_turn, response_text)
+        save_history(bot_name, session_id, history, response_text)
+
+    with timer.stage("serialize"):
+        if stream:
+            # Answer without an LLM call (low confidence or cached): send it as a single chunk
+            resp = Response(ndjson_line({"token": response_text}) + ndjson_line({"done": True, "response": response_text}),
+                            mimetype="application/x-ndjson")
+        else:
+            resp = jsonify({"response": response_text})
+    timer.finish()
+    resp.headers.update(timing_headers(timer, debug_timing))
+    return resp
 
 @app.route("/bots", methods=["GET"])
 def list_bots():
@@ -478,7 +1298,35 @@ def serve_static(filename):
 
 @app.route("/health", methods=["GET"])
 def health_check():
-    return jsonify({"status": "ok"})
+    """Liveness: answers as soon as the server is up, even while warm-up is running."""
+    return jsonify(health_status())
+
+@app.route("/ready", methods=["GET"])
+def readiness_check():
+    """Readiness: 200 once warm-up has loaded the model and hot bot indexes, 503 before (or if it failed)."""
+    ready = warmup_state["status"] in ("ready", "preloaded", "off")
+    return jsonify({"ready": ready, **warmup_state}), 200 if ready else 503
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus metrics: per-bot, per-stage chat latency histograms and process gauges."""
+    return Response(metrics_text(llm_client), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route("/llm/stats", methods=["GET"])
+def llm_stats():
+    """In-flight / queued LLM requests and per-endpoint counters for this process."""
+    return jsonify(llm_client.stats())
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    """Hit/miss counters for the query caches (used to size them)."""
+    return jsonify({
+        "query_embedding": query_embedding_cache.stats(),
+        "retrieval": retrieval_cache.stats(),
+        "responses": {name: cache.stats() for name, cache in response_caches.items()},
+        "indexes": {**cached_indexes.stats(), "bots": cached_indexes.sizes()},
+        "sessions": session_store.stats(),
+    })
 
 @app.route("/theme/<bot_name>", methods=["GET"])
 def get_theme(bot_name):
@@ -513,31 +1361,24 @@ def delete_bot(bot_name):
     if bot_name not in bot_configs:
         return jsonify({"error": "Bot not found"}), 404
 
-    config = bot_configs[bot_name]
+    config = bot_configs.pop(bot_name)
     bot_folder = os.path.join(BOT_CONFIG_FOLDER, bot_name)
+    release_bot_index(bot_name)
 
     try:
-        # Remove knowledge base files
-        if os.path.exists(config["index_path"]):
-            os.remove(config["index_path"])
-        if os.path.exists(config["meta_path"]):
-            os.remove(config["meta_path"])
-        
-        kb_file_path = os.path.join(UPLOAD_FOLDER, config["file"])
-        if os.path.exists(kb_file_path):
-            os.remove(kb_file_path)
-        
-        # Remove bot config file
+        # Remove bot config file first: once it is gone no worker loads the bot again,
+        # even if some of its files cannot be removed yet
         config_file_path = os.path.join(bot_folder, f"{bot_name}.json")
         if os.path.exists(config_file_path):
             os.remove(config_file_path)
+
+        # Remove knowledge base files
+        remove_files(kb_files(config))
         
         # Remove avatar if exists
         avatar_filename = config.get("avatar")
         if avatar_filename:
-            avatar_path = os.path.join(bot_folder, avatar_filename)
-            if os.path.exists(avatar_path):
-                os.remove(avatar_path)
+            remove_files([os.path.join(bot_folder, avatar_filename)])
         
         # Remove bot folder if empty
         if os.path.exists(bot_folder) and not os.listdir(bot_folder):
@@ -547,19 +1388,32 @@ def delete_bot(bot_name):
         print(f"Delete error: {e}")
 
     # Clean up in-memory stores
-    bot_configs.pop(bot_name, None)
-    cached_indexes.pop(bot_name, None)
-    chat_histories.pop(bot_name, None)
+    session_store.delete_bot(bot_name)
     bot_themes.pop(bot_name, None)
+    bump_config_generation()
 
     return jsonify({"message": f"Bot '{bot_name}' deleted."})
 
+@app.before_request
+def sync_worker_state():
+    sync_bot_configs()
+
 @app.route("/admin")
 def admin_panel():
     return render_template("admin.html")
 
-# Load all existing bots on startup
-load_all_bots()
+# Load all existing bot configs on startup; models and indexes are loaded by the warm-up.
+# Skipped when a PDF worker re-imports this script as __mp_main__ (python app.py with
+# spawn / forkserver workers): it must not load bots or the model.
+if __name__ != "__mp_main__":
+    load_all_bots()
+    if WARMUP == "background":
+        start_warmup()
+    elif WARMUP == "preload":
+        embedding_model.encode(["warm up"], show_progress_bar=False)
+        warmup_state["status"] = "preloaded"
+    else:
+        warmup_state["status"] = "off"
 
 if __name__ == "__main__":
     # For production consider using gunicorn + nginx
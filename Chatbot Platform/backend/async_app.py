@@ -0,0 +1,212 @@
+"""
+Asyncio serving path for the chatbot platform.
+
+The chat route runs on the event loop: retrieval and query embedding are
+awaited in a worker thread and the Ollama call goes through a pooled async
+HTTP client, so a slow LLM call no longer pins a worker thread. Every other
+route (admin, themes, avatars, static files) is served by the Flask app.
+
+Run with:  uvicorn async_app:app --port 5000
+Multi-process:  gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker async_app:app
+"""
+import os
+import time
+from contextlib import asynccontextmanager
+
+import anyio
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.wsgi import WSGIMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+import app as core
+from llm_client import AsyncLLMClient, LLMError, LLMOverloaded
+from metrics import StageTimer
+
+# --- Async LLM client (same limits as the Flask app's, plus the connection pool size) ---
+OLLAMA_MAX_CONNECTIONS = int(os.environ.get("OLLAMA_MAX_CONNECTIONS", "256"))
+
+llm_client = AsyncLLMClient(core.OLLAMA_API_URLS, max_connections=OLLAMA_MAX_CONNECTIONS, **core.LLM_CLIENT_SETTINGS)
+
+@asynccontextmanager
+async def lifespan(_app):
+    await llm_client.start()
+    yield
+    await llm_client.close()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+async def agenerate_ollama(messages, bot_name):
+    """Async version of core.generate_ollama using the pooled client."""
+    try:
+        response_json = await llm_client.chat(core.ollama_payload(messages, False), bot_name, core.bot_priority(bot_name))
+        return response_json.get("message", {}).get("content", "Sorry, no response from model.")
+    except LLMOverloaded:
+        raise
+    except LLMError as e:
+        return f"❌ {str(e)}"
+
+async def astream_ollama(messages, bot_name):
+    """
+    Async version of core.stream_ollama using the pooled client. Returns the token
+    iterator and a coroutine function that gives the LLM slot back; await it once the
+    response is over, whether or not the iterator was ever started.
+    """
+    try:
+        chunks = await llm_client.stream_chat(core.ollama_payload(messages, True), bot_name, core.bot_priority(bot_name))
+    except LLMOverloaded:
+        raise
+    except LLMError as e:
+        error = f"❌ {str(e)}"
+
+        async def error_token():
+            yield error
+
+        async def nothing_to_close():
+            pass
+        return error_token(), nothing_to_close
+    return aollama_tokens(chunks), chunks.aclose
+
+async def aollama_tokens(chunks):
+    """Async version of core.ollama_tokens."""
+    try:
+        async for chunk in chunks:
+            token = chunk.get("message", {}).get("content", "")
+            if token:
+                yield token
+            if chunk.get("done"):
+                break
+    except LLMError as e:
+        yield f"❌ {str(e)}"
+    finally:
+        await chunks.aclose()
+
+class ClosingStreamingResponse(StreamingResponse):
+    """StreamingResponse that awaits `close` however the response ends: sent, failed or cancelled."""
+
+    def __init__(self, content, close, **kwargs):
+        super().__init__(content, **kwargs)
+        self.close = close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self.close()
+
+def overloaded_response():
+    return JSONResponse({"error": "The model is busy, please retry shortly."},
+                        status_code=503, headers={"Retry-After": "5"})
+
+def rate_limited_response(retry_after):
+    return JSONResponse({"error": "Too many requests, please slow down."},
+                        status_code=429, headers={"Retry-After": str(int(retry_after) + 1)})
+
+@app.get("/llm/stats")
+async def llm_stats():
+    """In-flight / queued LLM requests and per-endpoint counters for this process."""
+    return llm_client.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics, with the LLM gauges of this server's async client."""
+    text = await run_in_threadpool(core.metrics_text, llm_client)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+@app.post("/chat/{bot_name}")
+async def chat(bot_name: str, request: Request):
+    # Pick up bots changed by other worker processes (reads their config files: off the event loop)
+    await run_in_threadpool(core.sync_bot_configs)
+    if bot_name not in core.bot_configs:
+        return JSONResponse({"error": "Bot not found"}, status_code=404)
+
+    data = await request.json()
+    user_query = data.get("query", "").strip()
+    session_id = data.get("session_id", "").strip()
+    stream = bool(data.get("stream", False))
+
+    if not user_query or not session_id:
+        return JSONResponse({"error": "Both 'query' and 'session_id' are required."}, status_code=400)
+
+    retry_after = core.check_rate_limit(bot_name, session_id)
+    if retry_after:
+        return rate_limited_response(retry_after)
+
+    role = core.bot_configs[bot_name]["role"]
+    timer = StageTimer(core.stage_metrics, bot_name)
+    debug_timing = core.debug_timing_requested(request.headers)
+
+    # Embedding + FAISS search are CPU-bound: keep them off the event loop
+    try:
+        closest_distance, kb_chunks, context_ids = await run_in_threadpool(
+            core.retrieve_context, bot_name, user_query, timer)
+    except Exception as e:
+        return JSONResponse({"error": f"Failed to load index or metadata: {str(e)}"}, status_code=500)
+
+    if not kb_chunks:
+        response_text = core.low_confidence_response(role, closest_distance)
+    else:
+        # Sessions and stage histograms may live in SQLite (SESSION_DB / SHARED_STATE_DB):
+        # their reads and writes run in a worker thread, never on the event loop
+        history, first_turn = await run_in_threadpool(core.prepare_history, bot_name, session_id, user_query)
+        with timer.stage("answer_cache"):
+            response_text = await run_in_threadpool(
+                core.lookup_cached_answer, bot_name, user_query, context_ids, first_turn)
+
+        if response_text is None and stream:
+            # Tokenizing and packing the prompt is CPU-bound too
+            with timer.stage("prompt_build"):
+                messages = await run_in_threadpool(core.build_messages, bot_name, kb_chunks, history, user_query)
+            llm_start = time.perf_counter()
+            try:
+                token_stream, close_stream = await astream_ollama(messages, bot_name)
+            except LLMOverloaded:
+                return overloaded_response()
+            headers = core.timing_headers(timer, debug_timing)
+
+            async def generate():
+                tokens = []
+                async for token in token_stream:
+                    if not tokens:
+                        timer.record("llm_first_token", time.perf_counter() - llm_start)
+                    tokens.append(token)
+                    yield core.timed_ndjson_line(timer, {"token": token})
+                timer.record("llm_total", time.perf_counter() - llm_start)
+                response_text = "".join(tokens)
+
+                # Save history once the stream has finished
+                await run_in_threadpool(
+                    core.remember_answer, bot_name, user_query, context_ids, first_turn, response_text)
+                await run_in_threadpool(core.save_history, bot_name, session_id, history, response_text)
+                yield await run_in_threadpool(core.stream_done_line, timer, response_text, debug_timing)
+
+            # The LLM slot is held until the response is over, even if it never starts streaming
+            return ClosingStreamingResponse(generate(), close_stream, media_type="application/x-ndjson", headers=headers)
+
+        if response_text is None:
+            with timer.stage("prompt_build"):
+                messages = await run_in_threadpool(core.build_messages, bot_name, kb_chunks, history, user_query)
+            try:
+                with timer.stage("llm_total"):
+                    response_text = await agenerate_ollama(messages, bot_name)
+            except LLMOverloaded:
+                return overloaded_response()
+            await run_in_threadpool(
+                core.remember_answer, bot_name, user_query, context_ids, first_turn, response_text)
+        await run_in_threadpool(core.save_history, bot_name, session_id, history, response_text)
+
+    with timer.stage("serialize"):
+        if stream:
+            body = core.ndjson_line({"token": response_text}) + core.ndjson_line({"done": True, "response": response_text})
+            resp = StreamingResponse(iter([body]), media_type="application/x-ndjson")
+        else:
+            resp = JSONResponse({"response": response_text})
+    await run_in_threadpool(timer.finish)
+    resp.headers.update(core.timing_headers(timer, debug_timing))
+    return resp
+
+# Everything else is handled by the existing Flask routes
+app.mount("/", WSGIMiddleware(core.app))
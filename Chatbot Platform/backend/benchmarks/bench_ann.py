@@ -0,0 +1,90 @@
+"""
+ANN index benchmark: recall@10 vs. latency and memory per index type.
+
+Builds each index type from ann_index.py on synthetic clustered,
+L2-normalized 384-d vectors (MiniLM-like) and compares it to exact search.
+
+Usage (from the backend directory):
+    python benchmarks/bench_ann.py --sizes 10000 100000 1000000 --queries 500
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_index import INDEX_TYPES, build_index
+from common import percentile, write_results
+
+DIM = 384
+K = 10
+
+def synthetic_corpus(num_vectors, num_queries, num_clusters=256, seed=0):
+    """Gaussian-mixture vectors normalized to unit length, plus held-out queries."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((num_clusters, DIM)).astype('float32')
+
+    def sample(n):
+        labels = rng.integers(0, num_clusters, n)
+        points = centers[labels] + 0.6 * rng.standard_normal((n, DIM)).astype('float32')
+        faiss.normalize_L2(points)
+        return points
+
+    return sample(num_vectors), sample(num_queries)
+
+def index_bytes(index):
+    return int(faiss.serialize_index(index).nbytes)
+
+def bench_index(index, queries, ground_truth):
+    """Single-query latency (the chat path searches one query at a time) and recall@K."""
+    latencies = []
+    found = np.empty((len(queries), K), dtype='int64')
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, ids = index.search(queries[i:i + 1], K)
+        latencies.append(time.perf_counter() - start)
+        found[i] = ids[0]
+
+    hits = sum(len(set(found[i]) & set(ground_truth[i])) for i in range(len(queries)))
+    return {
+        "recall_at_10": round(hits / (len(queries) * K), 4),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=list(INDEX_TYPES))
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--output", default="-", help="JSON results file ('-' for stdout)")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        corpus, queries = synthetic_corpus(size, args.queries)
+        exact = faiss.IndexFlatL2(DIM)
+        exact.add(corpus)
+        _, ground_truth = exact.search(queries, K)
+
+        for index_type in args.types:
+            start = time.perf_counter()
+            index, settings = build_index(corpus, index_type)
+            build_s = time.perf_counter() - start
+
+            row = {"size": size, "index": settings, "build_s": round(build_s, 2),
+                   "memory_mb": round(index_bytes(index) / 2**20, 1)}
+            row.update(bench_index(index, queries, ground_truth))
+            results.append(row)
+            print(f"[INFO] n={size:<8d} {settings['type']:9s} recall@10={row['recall_at_10']:.3f}  "
+                  f"p50={row['p50_ms']:7.3f} ms  p99={row['p99_ms']:7.3f} ms  "
+                  f"mem={row['memory_mb']:8.1f} MB  build={row['build_s']:6.1f} s")
+
+    write_results(args.output, {"benchmark": "ann", "dim": DIM, "k": K, "results": results})
+
+if __name__ == "__main__":
+    main()
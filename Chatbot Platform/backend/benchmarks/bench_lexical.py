@@ -0,0 +1,103 @@
+"""
+Lexical (BM25) index benchmark: build time, size, lookup latency and exact-match hits.
+
+Builds lexical_index.py indexes over synthetic university-style chunks that
+mention course codes, fee amounts and contact emails, then queries them for
+one exact token of a random chunk (the kind of query embeddings handle
+badly) and for a few common words. hit@1 / hit@10 is the share of
+exact-token queries whose chunk is ranked first / in the top 10.
+
+Usage (from the backend directory):
+    python benchmarks/bench_lexical.py --sizes 10000 100000 --queries 1000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import percentile, write_results
+from lexical_index import LexicalIndex, LexicalIndexBuilder
+
+K = 10
+WORDS = ("admission fees hostel course semester exam scholarship library campus department "
+         "registration deadline document eligibility counselling refund transport canteen "
+         "laboratory project internship placement attendance result schedule faculty").split()
+
+def synthetic_chunk(rng, i):
+    """A chunk with a unique course code, fee amount and email plus common filler words."""
+    filler = " ".join(rng.choice(WORDS) for _ in range(40))
+    code, fee, email = f"cs-{i:06d}", f"{10_000 + i:,}", f"office{i}@juit.ac.in"
+    return (f"Course {code}: {filler}. The fee is Rs. {fee} per semester. "
+            f"Contact {email} for details."), (code, fee, email)
+
+def timed_search(index, query):
+    start = time.perf_counter()
+    ids, _, _ = index.search(query, K)
+    return time.perf_counter() - start, ids
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--output", default="-", help="JSON results file ('-' for stdout)")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        rng = random.Random(0)
+        builder = LexicalIndexBuilder()
+        exact_terms = []
+        start = time.perf_counter()
+        for i in range(size):
+            text, terms = synthetic_chunk(rng, i)
+            builder.add(text)
+            exact_terms.append(terms)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.kbl")
+            builder.write(path)
+            build_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            index = LexicalIndex(path)
+            open_ms = (time.perf_counter() - start) * 1000
+
+            exact_latencies, hits_at_1, hits_at_10 = [], 0, 0
+            for _ in range(args.queries):
+                doc = rng.randrange(size)
+                query = f"What about {rng.choice(exact_terms[doc])}?"
+                latency, ids = timed_search(index, query)
+                exact_latencies.append(latency)
+                hits_at_1 += bool(len(ids)) and ids[0] == doc
+                hits_at_10 += doc in ids.tolist()
+
+            # Common words match many chunks, so these read the capped postings lists
+            common_latencies = [timed_search(index, " ".join(rng.sample(WORDS, 3)))[0]
+                                for _ in range(args.queries)]
+
+            row = {
+                "size": size,
+                "build_s": round(build_s, 2),
+                "open_ms": round(open_ms, 3),
+                "file_mb": round(os.path.getsize(path) / 2**20, 1),
+                "hit_at_1": round(hits_at_1 / args.queries, 4),
+                "hit_at_10": round(hits_at_10 / args.queries, 4),
+                "exact_p50_ms": round(percentile(exact_latencies, 50) * 1000, 3),
+                "exact_p99_ms": round(percentile(exact_latencies, 99) * 1000, 3),
+                "common_p50_ms": round(percentile(common_latencies, 50) * 1000, 3),
+                "common_p99_ms": round(percentile(common_latencies, 99) * 1000, 3),
+            }
+            del index
+        results.append(row)
+        print(f"[INFO] n={size:<8d} hit@1={row['hit_at_1']:.3f} hit@10={row['hit_at_10']:.3f}  "
+              f"exact p50={row['exact_p50_ms']:.3f} ms p99={row['exact_p99_ms']:.3f} ms  "
+              f"common p50={row['common_p50_ms']:.3f} ms p99={row['common_p99_ms']:.3f} ms  "
+              f"file={row['file_mb']:.1f} MB  build={row['build_s']:.1f} s")
+
+    write_results(args.output, {"benchmark": "lexical", "k": K, "results": results})
+
+if __name__ == "__main__":
+    main()
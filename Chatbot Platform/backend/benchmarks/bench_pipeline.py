@@ -0,0 +1,197 @@
+"""
+Knowledge base pipeline benchmark: ingestion, index load and retrieval, in process.
+
+For each format (JSON `phases`, free-form nested JSON, table PDF, prose PDF)
+and size, a
+synthetic knowledge base is generated and built with
+app.process_uploaded_file. Sizes are nominal (one chunk per string leaf,
+table row or prose line); the chunker decides how many chunks result. Extraction alone and the full build (extract,
+embed, index) are both timed. The bots are then registered the way an
+upload job does. After that the benchmark measures:
+- startup: app.load_all_bots() over every bot, then the first (lazy)
+  get_bot_index of each. The files are in the OS page cache by then, so
+  these are warm loads.
+- retrieval: retrieve_context latency on distinct queries with the query
+  caches cleared (uncached), then the same queries again (cached), then
+  uncached throughput from --threads threads.
+
+The app runs in a temporary directory, so no bots are left behind.
+
+Usage (from the backend directory):
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 --formats phases nested pdf prose
+"""
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import (BACKEND_DIR, percentile, synthetic_nested_kb, synthetic_phases_kb,
+                    write_pdf_kb, write_results)
+
+sys.path.insert(0, BACKEND_DIR)
+
+NODES_PER_PHASE = 100
+COURSES_PER_DEPARTMENT = 20
+ROWS_PER_PAGE = 25
+
+def write_kb(fmt, size, folder):
+    """Write a knowledge base of about `size` chunks; returns (path, query generator)."""
+    if fmt == "phases":
+        phases = max(1, math.ceil(size / NODES_PER_PHASE))
+        kb = synthetic_phases_kb(phases, min(size, NODES_PER_PHASE))
+        path = os.path.join(folder, f"bench_{fmt}_{size}.json")
+        queries = lambda rng: f"What are the fees for topic {rng.randrange(phases)}-{rng.randrange(min(size, NODES_PER_PHASE))}?"
+    elif fmt == "nested":
+        # Each department has 3 string leaves plus 2 per course (chunks with CHUNKING=leaf)
+        departments = max(1, round(size / (3 + 2 * COURSES_PER_DEPARTMENT)))
+        kb = synthetic_nested_kb(departments, COURSES_PER_DEPARTMENT)
+        path = os.path.join(folder, f"bench_{fmt}_{size}.json")
+        queries = lambda rng: (f"What is the fee for course "
+                               f"CS-{rng.randrange(departments):02d}{rng.randrange(COURSES_PER_DEPARTMENT):02d}?")
+    elif fmt == "pdf":
+        pages = max(1, size // ROWS_PER_PAGE)
+        path = os.path.join(folder, f"bench_{fmt}_{size}.pdf")
+        write_pdf_kb(path, pages, ROWS_PER_PAGE)
+        return path, lambda rng: f"Where is employee E{rng.randrange(pages):03d}{rng.randrange(ROWS_PER_PAGE):03d} transferred?"
+    elif fmt == "prose":
+        pages = max(1, size // ROWS_PER_PAGE)
+        path = os.path.join(folder, f"bench_{fmt}_{size}.pdf")
+        write_pdf_kb(path, pages, ROWS_PER_PAGE, tables=False)
+        return path, lambda rng: (f"When may employees of department {rng.randrange(7)} transfer "
+                                  f"under section {rng.randrange(pages)}.{rng.randrange(ROWS_PER_PAGE)}?")
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(kb, f)
+    return path, queries
+
+def distinct_queries(make_query, count, seed=0):
+    rng = random.Random(seed)
+    queries = []
+    seen = set()
+    for _ in range(count * 20):
+        query = make_query(rng)
+        if query not in seen:
+            seen.add(query)
+            queries.append(query)
+            if len(queries) == count:
+                break
+    return queries
+
+def clear_query_caches(app):
+    app.query_embedding_cache.clear()
+    app.retrieval_cache.clear()
+
+def time_queries(app, bot_name, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        app.retrieve_context(bot_name, query)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def bench_retrieval(app, bot_name, queries, threads):
+    clear_query_caches(app)
+    app.retrieve_context(bot_name, "warm up")
+    clear_query_caches(app)
+    uncached = time_queries(app, bot_name, queries)
+    cached = time_queries(app, bot_name, queries)
+
+    clear_query_caches(app)
+    with ThreadPoolExecutor(threads) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda query: app.retrieve_context(bot_name, query), queries))
+        wall = time.perf_counter() - start
+    return {
+        "queries": len(queries),
+        "uncached_p50_ms": round(percentile(uncached, 50) * 1000, 3),
+        "uncached_p99_ms": round(percentile(uncached, 99) * 1000, 3),
+        "cached_p50_ms": round(percentile(cached, 50) * 1000, 3),
+        "cached_p99_ms": round(percentile(cached, 99) * 1000, 3),
+        "threads": threads,
+        "uncached_qps": round(len(queries) / wall, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000], help="Approximate chunks per KB")
+    parser.add_argument("--formats", nargs="+", default=["phases", "nested", "pdf", "prose"], choices=["phases", "nested", "pdf", "prose"])
+    parser.add_argument("--queries", type=int, default=200, help="Distinct retrieval queries per KB")
+    parser.add_argument("--threads", type=int, default=8, help="Threads for the throughput run")
+    parser.add_argument("--output", default="-", help="JSON results file ('-' for stdout)")
+    args = parser.parse_args()
+    output = args.output if args.output == "-" else os.path.abspath(args.output)
+
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.chdir(workdir)
+    import app  # Creates its upload, index and config folders in workdir
+    from tokens import count_tokens
+
+    results = []
+    bots = {}
+    try:
+        app.embedding_model.encode(["warm up"])
+        for fmt in args.formats:
+            for size in args.sizes:
+                path, make_query = write_kb(fmt, size, app.UPLOAD_FOLDER)
+                start = time.perf_counter()
+                chunk_tokens = [count_tokens(text) for text, _ in app.iter_file_chunks(path)]
+                extract_s = time.perf_counter() - start
+                chunks = len(chunk_tokens)
+
+                start = time.perf_counter()
+                kb_update = app.process_uploaded_file(path)
+                ingest_s = time.perf_counter() - start
+
+                bot_name = f"bench_{fmt}_{size}"
+                kb_update.update({"file": os.path.basename(path), "appended_files": []})
+                app.apply_bot_update(bot_name, "Benchmark assistant", None, None, kb_update)
+                bots[bot_name] = (fmt, size, make_query)
+                results.append({
+                    "stage": "ingestion", "format": fmt, "size": size, "chunks": chunks,
+                    "avg_chunk_tokens": round(sum(chunk_tokens) / max(chunks, 1), 1),
+                    "file_mb": round(os.path.getsize(path) / 2**20, 2),
+                    "extract_s": round(extract_s, 3),
+                    "ingest_s": round(ingest_s, 3),
+                    "chunks_per_s": round(chunks / ingest_s, 1),
+                })
+                print(f"[INFO] ingest {fmt:6s} n={chunks:<7d} ~{results[-1]['avg_chunk_tokens']:5.1f} tok  extract={extract_s:7.2f} s  "
+                      f"build={ingest_s:7.2f} s  ({chunks / ingest_s:8.1f} chunks/s)")
+
+        # Startup: configs only, then each bot's index on its first chat
+        app.bot_configs.clear()
+        for bot_name in bots:
+            app.cached_indexes.pop(bot_name, None)
+        start = time.perf_counter()
+        app.load_all_bots()
+        load_all_ms = (time.perf_counter() - start) * 1000
+        results.append({"stage": "startup", "bots": len(bots), "load_all_bots_ms": round(load_all_ms, 3)})
+        print(f"[INFO] load_all_bots: {len(bots)} bots in {load_all_ms:.2f} ms")
+
+        for bot_name, (fmt, size, make_query) in bots.items():
+            start = time.perf_counter()
+            app.get_bot_index(bot_name)
+            first_load_ms = (time.perf_counter() - start) * 1000
+            row = {"stage": "retrieval", "format": fmt, "size": size,
+                   "index_mb": round(app.cached_indexes.sizes()[bot_name] / 2**20, 2),
+                   "first_load_ms": round(first_load_ms, 3)}
+            row.update(bench_retrieval(app, bot_name, distinct_queries(make_query, args.queries), args.threads))
+            results.append(row)
+            print(f"[INFO] search {fmt:6s} size={size:<7d} load={first_load_ms:8.2f} ms  "
+                  f"uncached p50={row['uncached_p50_ms']:7.3f} ms p99={row['uncached_p99_ms']:7.3f} ms  "
+                  f"cached p50={row['cached_p50_ms']:7.3f} ms  {row['uncached_qps']:8.1f} q/s ({args.threads} threads)")
+    finally:
+        os.chdir(BACKEND_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    write_results(output, {"benchmark": "pipeline", "results": results})
+
+if __name__ == "__main__":
+    main()
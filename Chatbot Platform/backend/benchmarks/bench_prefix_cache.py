@@ -0,0 +1,85 @@
+"""
+Prompt-cache benchmark: prefill tokens saved per conversation turn.
+
+The Flask app is started against the stub Ollama server, which simulates
+Ollama's KV cache (a few slots, prefix matching). Multi-turn sessions are
+run one request at a time, and after each request the stub's counters show
+how many prompt tokens had to be prefilled and how many were reused from
+the cache. Reports the averages per turn number.
+
+Usage (from the backend directory):
+    python benchmarks/bench_prefix_cache.py --sessions 20 --turns 5
+"""
+import argparse
+
+import requests
+
+from common import (server_workdir, start_process, start_stub_ollama, stop_process,
+                    synthetic_phases_kb, upload_bot, wait_for_http, write_results)
+
+BOT_NAME = "bench_prefix_bot"
+
+def stub_stats(stub_url):
+    return requests.get(f"{stub_url}/stats", timeout=10).json()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=5, help="Chat turns per session")
+    parser.add_argument("--cache-slots", type=int, default=4, help="KV cache slots of the stub")
+    parser.add_argument("--prefill-token-ms", type=float, default=0.5, help="Stub prefill time per uncached token")
+    parser.add_argument("--stub-port", type=int, default=11500)
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--output", default="-", help="JSON results file ('-' for stdout)")
+    args = parser.parse_args()
+
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    stub = start_stub_ollama(args.stub_port, prefill_ms=0, token_ms=0, tokens=40,
+                             prefill_token_ms=args.prefill_token_ms, cache_slots=args.cache_slots)
+    base_url = f"http://127.0.0.1:{args.port}"
+    per_turn = [{"prompt_tokens": 0, "prefill_tokens": 0} for _ in range(args.turns)]
+    try:
+        with server_workdir("bench_prefix_cache_") as workdir:
+            server = start_process(["flask", "--app", "app", "run", "--port", str(args.port)],
+                                   {"OLLAMA_API_URL": f"{stub_url}/api/chat"}, cwd=workdir)
+            try:
+                wait_for_http(f"{base_url}/ready")
+                upload_bot(base_url, BOT_NAME, synthetic_phases_kb())
+                requests.post(f"{stub_url}/stats/reset", timeout=10)
+                for session in range(args.sessions):
+                    for turn in range(args.turns):
+                        before = stub_stats(stub_url)
+                        resp = requests.post(
+                            f"{base_url}/chat/{BOT_NAME}",
+                            json={"query": f"What are the fees for topic {turn}-{session % 20}?",
+                                  "session_id": f"prefix_{session}"},
+                            timeout=300,
+                        )
+                        resp.raise_for_status()
+                        after = stub_stats(stub_url)
+                        for key in per_turn[turn]:
+                            per_turn[turn][key] += after[key] - before[key]
+            finally:
+                stop_process(server)
+    finally:
+        stop_process(stub)
+
+    results = []
+    for turn, totals in enumerate(per_turn, start=1):
+        prompt_tokens = totals["prompt_tokens"] / args.sessions
+        prefill_tokens = totals["prefill_tokens"] / args.sessions
+        row = {
+            "turn": turn,
+            "prompt_tokens": round(prompt_tokens, 1),
+            "prefill_tokens": round(prefill_tokens, 1),
+            "saved_tokens": round(prompt_tokens - prefill_tokens, 1),
+            "saved_pct": round(100 * (1 - prefill_tokens / prompt_tokens), 1) if prompt_tokens else 0.0,
+        }
+        results.append(row)
+        print(f"[INFO] turn {turn}: {row['prompt_tokens']:7.1f} prompt tokens, "
+              f"{row['prefill_tokens']:7.1f} prefilled, {row['saved_tokens']:7.1f} saved ({row['saved_pct']}%)")
+
+    write_results(args.output, {"benchmark": "prefix_cache", "results": results})
+
+if __name__ == "__main__":
+    main()
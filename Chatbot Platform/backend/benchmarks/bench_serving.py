@@ -0,0 +1,107 @@
+"""
+Load benchmark: Flask app vs. asyncio serving path (async_app.py).
+
+Both servers are started against the stub Ollama server, a throwaway bot is
+uploaded, and /chat/<bot_name> is hit at increasing concurrency levels.
+Reports throughput and p50/p99 latency per server and concurrency level.
+
+Usage (from the backend directory):
+    python benchmarks/bench_serving.py --concurrency 10 50 200 --requests 400
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+from common import (percentile, server_workdir, start_process, start_stub_ollama, stop_process,
+                    synthetic_phases_kb, upload_bot, wait_for_http, write_results)
+
+BOT_NAME = "bench_serving_bot"
+
+SERVERS = {
+    "flask": lambda port: ["flask", "--app", "app", "run", "--port", str(port)],
+    "async": lambda port: ["uvicorn", "async_app:app", "--port", str(port), "--log-level", "warning"],
+}
+
+async def run_load(base_url, concurrency, total_requests, stream):
+    """Fire total_requests chats with at most `concurrency` in flight."""
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300)) as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    async with client.post(
+                        f"{base_url}/chat/{BOT_NAME}",
+                        json={"query": f"What are the fees for topic 1-{i % 20}?",
+                              "session_id": f"bench_{i}", "stream": stream},
+                    ) as resp:
+                        await resp.read()
+                        if resp.status != 200:
+                            errors += 1
+                            return
+                except aiohttp.ClientError:
+                    errors += 1
+                    return
+                latencies.append(time.perf_counter() - start)
+
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total_requests)))
+        wall = time.perf_counter() - wall_start
+
+    return {
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", nargs="+", default=list(SERVERS), choices=list(SERVERS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[10, 50, 200])
+    parser.add_argument("--requests", type=int, default=400, help="Requests per concurrency level")
+    parser.add_argument("--stream", action="store_true", help="Use the streaming chat mode")
+    parser.add_argument("--stub-port", type=int, default=11500)
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--prefill-ms", type=float, default=200)
+    parser.add_argument("--token-ms", type=float, default=20)
+    parser.add_argument("--output", default="-", help="JSON results file ('-' for stdout)")
+    args = parser.parse_args()
+
+    stub = start_stub_ollama(args.stub_port, prefill_ms=args.prefill_ms, token_ms=args.token_ms)
+    # The stub has no real capacity limit, so let every request through to it
+    env = {"OLLAMA_API_URL": f"http://127.0.0.1:{args.stub_port}/api/chat",
+           "LLM_MAX_CONCURRENCY": "4096", "LLM_MAX_QUEUE": "4096"}
+    results = []
+    try:
+        for name in args.servers:
+            base_url = f"http://127.0.0.1:{args.port}"
+            with server_workdir(f"bench_serving_{name}_") as workdir:
+                server = start_process(SERVERS[name](args.port), env, cwd=workdir)
+                try:
+                    wait_for_http(f"{base_url}/ready")
+                    upload_bot(base_url, BOT_NAME, synthetic_phases_kb())
+                    for concurrency in args.concurrency:
+                        row = asyncio.run(run_load(base_url, concurrency, args.requests, args.stream))
+                        row["server"] = name
+                        results.append(row)
+                        print(f"[INFO] {name:5s} c={concurrency:<4d} {row['throughput_rps']:8.1f} req/s  "
+                              f"p50={row['p50_ms']:8.1f} ms  p99={row['p99_ms']:8.1f} ms  errors={row['errors']}")
+                finally:
+                    stop_process(server)
+    finally:
+        stop_process(stub)
+
+    write_results(args.output, {"benchmark": "serving", "results": results})
+
+if __name__ == "__main__":
+    main()
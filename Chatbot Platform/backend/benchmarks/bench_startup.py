@@ -0,0 +1,85 @@
+"""
+Startup benchmark: time until a fresh server process is live and until it is ready.
+
+A few bots are uploaded once, into a scratch working directory so that
+only they are warmed up. The server is then restarted --runs times,
+polling /health (liveness: answers right after import) and /ready
+(readiness: embedding model and bot indexes warmed up) to measure how long
+each takes from process start.
+
+Usage (from the backend directory):
+    python benchmarks/bench_startup.py --bots 3 --runs 5
+"""
+import argparse
+import time
+
+import requests
+
+from common import (percentile, server_workdir, start_process, stop_process, synthetic_phases_kb,
+                    upload_bot, wait_for_http, write_results)
+
+SERVERS = {
+    "flask": lambda port: ["flask", "--app", "app", "run", "--port", str(port)],
+    "async": lambda port: ["uvicorn", "async_app:app", "--port", str(port), "--log-level", "warning"],
+}
+
+def poll_until_ok(url, started, timeout=300):
+    """Seconds from `started` until url answers 200."""
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - started
+        except requests.RequestException:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} did not answer 200 within {timeout}s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", nargs="+", default=list(SERVERS), choices=list(SERVERS))
+    parser.add_argument("--bots", type=int, default=3, help="Bots to warm up at startup")
+    parser.add_argument("--runs", type=int, default=5, help="Restarts per server")
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--output", default="-", help="JSON results file ('-' for stdout)")
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    bot_names = [f"bench_startup_bot_{i}" for i in range(args.bots)]
+    results = []
+    with server_workdir("bench_startup_") as workdir:
+        server = start_process(SERVERS[args.servers[0]](args.port), cwd=workdir)
+        try:
+            wait_for_http(f"{base_url}/ready")
+            for bot_name in bot_names:
+                upload_bot(base_url, bot_name, synthetic_phases_kb(10, 100))
+        finally:
+            stop_process(server)
+
+        for name in args.servers:
+            live, ready = [], []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                server = start_process(SERVERS[name](args.port), cwd=workdir)
+                try:
+                    live.append(poll_until_ok(f"{base_url}/health", started))
+                    ready.append(poll_until_ok(f"{base_url}/ready", started))
+                finally:
+                    stop_process(server)
+            row = {
+                "server": name,
+                "bots": args.bots,
+                "runs": args.runs,
+                "live_p50_s": round(percentile(live, 50), 3),
+                "live_max_s": round(max(live), 3),
+                "ready_p50_s": round(percentile(ready, 50), 3),
+                "ready_max_s": round(max(ready), 3),
+            }
+            results.append(row)
+            print(f"[INFO] {name:5s} live after {row['live_p50_s']:6.2f} s (max {row['live_max_s']:.2f})  "
+                  f"ready after {row['ready_p50_s']:6.2f} s (max {row['ready_max_s']:.2f})")
+
+    write_results(args.output, {"benchmark": "startup", "results": results})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Noisy-neighbour load test: does a flood on one bot hurt another bot's latency?
+
+The server runs against the stub Ollama with only --llm-slots LLM slots,
+standing in for a model that can serve a few requests at a time. Two bots
+are uploaded. The "victim" bot gets a steady --victim-rps of chats (each
+from a new session), first alone and then while --flood-concurrency
+clients hammer the "noisy" bot as fast as they can (retrying 429 / 503
+answers after a short pause). Reports, per phase and bot, how many chats
+were answered, rate limited (429) or shed (503) and the p50/p99 latency of
+the answered ones. With fair queuing the victim's p99 during the flood
+stays close to its p99 alone.
+
+Usage (from the backend directory):
+    python benchmarks/bench_tenants.py --duration 20 --flood-concurrency 64
+    python benchmarks/bench_tenants.py --bot-rate-limit 5   # also cap each bot at 5 chats/s
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+import aiohttp
+
+from common import (percentile, server_workdir, start_process, start_stub_ollama, stop_process,
+                    synthetic_phases_kb, upload_bot, wait_for_http, write_results)
+
+VICTIM = "bench_tenants_victim"
+NOISY = "bench_tenants_noisy"
+
+SERVERS = {
+    "flask": lambda port: ["flask", "--app", "app", "run", "--port", str(port)],
+    "async": lambda port: ["uvicorn", "async_app:app", "--port", str(port), "--log-level", "warning"],
+}
+
+class Tally:
+    """Outcomes and latencies of one bot's chats in one phase."""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+
+    def row(self, phase, bot):
+        return {
+            "phase": phase,
+            "bot": bot,
+            "requests": sum(self.statuses.values()),
+            "ok": self.statuses.get(200, 0),
+            "rate_limited": self.statuses.get(429, 0),
+            "overloaded": self.statuses.get(503, 0),
+            "errors": sum(n for status, n in self.statuses.items() if status not in (200, 429, 503)),
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 1),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 1),
+        }
+
+async def chat(client, base_url, bot_name, session_id, tally):
+    """One chat; returns its HTTP status (0 on connection errors)."""
+    start = time.perf_counter()
+    try:
+        async with client.post(f"{base_url}/chat/{bot_name}",
+                               json={"query": "What are the fees for topic 1-3?", "session_id": session_id}) as resp:
+            await resp.read()
+            status = resp.status
+    except aiohttp.ClientError:
+        status = 0
+    tally.statuses[status] = tally.statuses.get(status, 0) + 1
+    if status == 200:
+        tally.latencies.append(time.perf_counter() - start)
+    return status
+
+async def run_phase(base_url, duration, victim_rps, flood_concurrency):
+    """Steady victim traffic for `duration` seconds, with `flood_concurrency` noisy clients alongside."""
+    victim, noisy = Tally(), Tally()
+    sessions = itertools.count()
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300)) as client:
+        deadline = time.perf_counter() + duration
+
+        async def flood():
+            while time.perf_counter() < deadline:
+                if await chat(client, base_url, NOISY, f"noisy_{next(sessions)}", noisy) != 200:
+                    await asyncio.sleep(0.01)
+
+        flooders = [asyncio.create_task(flood()) for _ in range(flood_concurrency)]
+        victims = []
+        for i in range(int(duration * victim_rps)):
+            await asyncio.sleep(max(0.0, deadline - duration + i / victim_rps - time.perf_counter()))
+            victims.append(asyncio.create_task(chat(client, base_url, VICTIM, f"victim_{next(sessions)}", victim)))
+        await asyncio.gather(*victims, *flooders)
+    return victim, noisy
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", default="async", choices=list(SERVERS))
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per phase")
+    parser.add_argument("--victim-rps", type=float, default=2, help="Steady chats per second on the victim bot")
+    parser.add_argument("--flood-concurrency", type=int, default=64, help="Clients flooding the noisy bot")
+    parser.add_argument("--llm-slots", type=int, default=4, help="LLM_MAX_CONCURRENCY of the server")
+    parser.add_argument("--bot-rate-limit", type=float, default=0, help="BOT_RATE_LIMIT of the server (0 = off)")
+    parser.add_argument("--stub-port", type=int, default=11500)
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--prefill-ms", type=float, default=50)
+    parser.add_argument("--token-ms", type=float, default=5)
+    parser.add_argument("--output", default="-", help="JSON results file ('-' for stdout)")
+    args = parser.parse_args()
+
+    stub = start_stub_ollama(args.stub_port, prefill_ms=args.prefill_ms, token_ms=args.token_ms)
+    env = {"OLLAMA_API_URL": f"http://127.0.0.1:{args.stub_port}/api/chat",
+           "LLM_MAX_CONCURRENCY": str(args.llm_slots),
+           "BOT_RATE_LIMIT": str(args.bot_rate_limit)}
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = []
+    try:
+        with server_workdir("bench_tenants_") as workdir:
+            server = start_process(SERVERS[args.server](args.port), env, cwd=workdir)
+            try:
+                wait_for_http(f"{base_url}/ready")
+                for bot_name in (VICTIM, NOISY):
+                    upload_bot(base_url, bot_name, synthetic_phases_kb())
+                for phase, flood_concurrency in (("alone", 0), ("flood", args.flood_concurrency)):
+                    victim, noisy = asyncio.run(run_phase(base_url, args.duration, args.victim_rps, flood_concurrency))
+                    for bot, tally in (("victim", victim), ("noisy", noisy)):
+                        if not tally.statuses:
+                            continue
+                        row = {"server": args.server, **tally.row(phase, bot)}
+                        results.append(row)
+                        print(f"[INFO] {phase:5s} {bot:6s} ok={row['ok']:<6d} 429={row['rate_limited']:<6d} "
+                              f"503={row['overloaded']:<6d} p50={row['p50_ms']:8.1f} ms  p99={row['p99_ms']:8.1f} ms")
+            finally:
+                stop_process(server)
+    finally:
+        stop_process(stub)
+
+    write_results(args.output, {"benchmark": "tenants", "results": results})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Shared helpers for the benchmark scripts."""
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(BACKEND_DIR, "benchmarks")
+
+def start_process(args, env=None, cwd=BACKEND_DIR):
+    """
+    Start a server subprocess from cwd (the backend directory by default). The
+    backend modules stay importable from any cwd, see server_workdir.
+    """
+    pythonpath = os.pathsep.join(filter(None, [BACKEND_DIR, os.environ.get("PYTHONPATH")]))
+    return subprocess.Popen(
+        [sys.executable, "-m", *args],
+        cwd=cwd,
+        env={**os.environ, "PYTHONPATH": pythonpath, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+@contextlib.contextmanager
+def server_workdir(prefix):
+    """
+    Empty working directory for the app servers of a benchmark, removed afterwards.
+    The app keeps its uploads, indexes and bot configs in its working directory, so
+    a server started there loads only the benchmark's bots and leaves the real ones alone.
+    """
+    workdir = tempfile.mkdtemp(prefix=prefix)
+    try:
+        yield workdir
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def start_stub_ollama(port, **settings):
+    """Start benchmarks/stub_ollama.py; settings map to STUB_* env vars."""
+    env = {f"STUB_{k.upper()}": str(v) for k, v in settings.items()}
+    proc = start_process(["uvicorn", "--app-dir", BENCH_DIR, "stub_ollama:app",
+                          "--port", str(port), "--log-level", "warning"], env)
+    wait_for_http(f"http://127.0.0.1:{port}/docs")
+    return proc
+
+def stop_process(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+def wait_for_http(url, timeout=180):
+    """Poll a URL until it answers, raising if it never does."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=2).status_code < 500:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {url} did not come up within {timeout}s")
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+def synthetic_phases_kb(num_phases=5, nodes_per_phase=20):
+    """Small knowledge base in the JSON `phases` format understood by the app."""
+    return {
+        "phases": [
+            {
+                "phase": f"Phase {p}",
+                "nodes": [
+                    {
+                        "title": f"Topic {p}-{n}",
+                        "description": f"Details about admission topic {p}-{n}: fees are {1000 + n * 50} "
+                                       f"per semester and the deadline is day {n} of month {p}.",
+                    }
+                    for n in range(nodes_per_phase)
+                ],
+            }
+            for p in range(num_phases)
+        ]
+    }
+
+def synthetic_nested_kb(num_sections=10, items_per_section=10):
+    """
+    Knowledge base in free-form nested JSON (no `phases`): a chunk per course
+    and per department contact (one per string leaf with CHUNKING=leaf).
+    """
+    return {
+        "university": "Benchmark University",
+        "departments": [
+            {
+                "name": f"Department {s}",
+                "contact": {"email": f"dept{s}@example.edu", "office": f"Block {s % 4}, room {100 + s}"},
+                "courses": [
+                    {
+                        "code": f"CS-{s:02d}{i:02d}",
+                        "summary": f"Course {s}-{i} covers topic {i} of department {s}; "
+                                   f"the fee is {2000 + 25 * i} per semester.",
+                    }
+                    for i in range(items_per_section)
+                ],
+            }
+            for s in range(num_sections)
+        ],
+    }
+
+def _pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf_kb(path, num_pages=10, rows_per_page=25, tables=True):
+    """
+    Write a PDF knowledge base without a PDF library: pages hold a ruled
+    employee-transfer table under a header row (one chunk per data row) or,
+    with tables=False, plain text (split into overlapping windows). Returns
+    the number of data rows, or of pages with tables=False.
+    """
+    columns = [("Employee", 40), ("Name", 130), ("Department", 250), ("From", 370), ("To", 470)]
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for page in range(num_pages):
+        ops = ["BT /F1 12 Tf 40 760 Td (" + _pdf_text(f"Transfer list, page {page + 1}") + ") Tj ET"]
+        if tables:
+            top, height = 740, 24
+            rows = [[title for title, _ in columns]] + [
+                [f"E{page:03d}{r:03d}", f"Employee {page}-{r}", f"Department {r % 7}",
+                 f"City {(page + r) % 11}", f"City {(page + 2 * r) % 13}"]
+                for r in range(rows_per_page)
+            ]
+            bottom = top - height * len(rows)
+            for i in range(len(rows) + 1):
+                ops.append(f"40 {top - i * height} m 570 {top - i * height} l S")
+            for x in [x for _, x in columns] + [570]:
+                ops.append(f"{x} {top} m {x} {bottom} l S")
+            for i, row in enumerate(rows):
+                for (_, x), cell in zip(columns, row):
+                    ops.append(f"BT /F1 9 Tf {x + 4} {top - (i + 1) * height + 8} Td ({_pdf_text(cell)}) Tj ET")
+        else:
+            for line in range(rows_per_page):
+                text = f"Section {page}.{line}: employees of department {line % 7} may transfer after {line + 1} years."
+                ops.append(f"BT /F1 10 Tf 40 {730 - line * 14} Td ({_pdf_text(text)}) Tj ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode("latin-1") + stream + b"\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_refs.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {num_pages} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode("latin-1")
+        out += body if isinstance(body, bytes) else body.encode("latin-1")
+        out += b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+    return num_pages * rows_per_page if tables else num_pages
+
+def upload_bot(base_url, bot_name, kb, role="Benchmark assistant", timeout=1800):
+    """Create a bot through /admin/upload and wait for its ingestion job to finish."""
+    resp = requests.post(
+        f"{base_url}/admin/upload",
+        data={"bot_name": bot_name, "bot_role": role},
+        files={"file": ("bench_kb.json", json.dumps(kb).encode(), "application/json")},
+        timeout=600,
+    )
+    resp.raise_for_status()
+    return wait_for_job(base_url, resp.json()["job_id"], timeout)
+
+def wait_for_job(base_url, job_id, timeout=1800):
+    """Poll an ingestion job until it completes; returns its final status."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = requests.get(f"{base_url}/admin/jobs/{job_id}", timeout=10).json()
+        if job["status"] == "completed":
+            return job
+        if job["status"] == "failed":
+            raise RuntimeError(f"Ingestion job {job_id} failed: {job['error']}")
+        time.sleep(0.2)
+    raise RuntimeError(f"Ingestion job {job_id} did not finish within {timeout}s")
+
+def run_info():
+    """Where and on what the benchmark ran, so results can be compared across commits and machines."""
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True,
+                                  timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+
+    return {
+        "commit": git("rev-parse", "HEAD") or None,
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no", "--", ".")),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def write_results(path, results):
+    """Write benchmark results, with run_info(), as JSON (path "-" prints to stdout)."""
+    text = json.dumps({**results, "run": run_info()}, indent=2)
+    if path == "-":
+        print(text)
+    else:
+        with open(path, "w") as f:
+            f.write(text)
+        print(f"[INFO] Results written to {path}")
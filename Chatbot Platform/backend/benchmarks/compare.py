@@ -0,0 +1,84 @@
+"""
+Compare two benchmark result files (from run_suite.py or a single benchmark script).
+
+Result rows are matched on their identifying fields (stage, format, size,
+server, concurrency, ...), and then every numeric metric is compared. A
+change of more than --threshold percent in the bad direction is flagged as
+a regression. For throughput, QPS, recall, hit and "saved" metrics higher
+is better; for everything else (latencies, times, sizes) lower is better.
+The exit status is 1 when there is a regression, so the script can gate CI.
+
+Usage:
+    python benchmarks/compare.py benchmarks/results/OLD.json benchmarks/results/NEW.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+ID_KEYS = ("stage", "server", "format", "index", "size", "concurrency", "stream", "turn", "phase", "bot")
+HIGHER_IS_BETTER = ("rps", "qps", "per_s", "recall", "hit_", "saved")
+# Workload descriptions, not measurements
+NEUTRAL = {"chunks", "requests", "queries", "threads", "bots", "runs", "prompt_tokens", "file_mb",
+           "avg_chunk_tokens", "ok", "rate_limited"}
+
+def load_rows(path):
+    """{(benchmark, identity): row} for a suite file or a single benchmark's file."""
+    with open(path) as f:
+        data = json.load(f)
+    benchmarks = data.get("benchmarks") or {data.get("benchmark", "benchmark"): data}
+    rows = {}
+    for name, result in benchmarks.items():
+        for row in result.get("results", []):
+            identity = []
+            for key in ID_KEYS:
+                if key in row:
+                    value = row[key]
+                    if isinstance(value, dict):  # e.g. ANN index settings: compare by type
+                        value = value.get("type", json.dumps(value, sort_keys=True))
+                    identity.append(f"{key}={value}")
+            rows[(name, " ".join(identity))] = row
+    return rows
+
+def metric_change(metric, old, new):
+    """Percent change, and whether it is worse than before."""
+    higher_is_better = any(marker in metric for marker in HIGHER_IS_BETTER)
+    if old == 0:
+        change = 0.0 if new == 0 else float("inf") if new > 0 else float("-inf")
+    else:
+        change = 100 * (new - old) / abs(old)
+    return change, (change < 0) if higher_is_better else (change > 0)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent change to report")
+    parser.add_argument("--all", action="store_true", help="Print every metric, not just the changed ones")
+    args = parser.parse_args()
+
+    old_rows, new_rows = load_rows(args.old), load_rows(args.new)
+    regressions = 0
+    for key in sorted(old_rows.keys() & new_rows.keys()):
+        old_row, new_row = old_rows[key], new_rows[key]
+        for metric, old in old_row.items():
+            new = new_row.get(metric)
+            if metric in ID_KEYS or isinstance(old, bool) or not isinstance(old, (int, float)) \
+                    or not isinstance(new, (int, float)):
+                continue
+            change, worse = metric_change(metric, old, new)
+            significant = abs(change) > args.threshold and metric not in NEUTRAL
+            if significant and worse:
+                regressions += 1
+            if significant or args.all:
+                flag = (" REGRESSION" if worse else " improved") if significant else ""
+                print(f"{key[0]:12s} {key[1]:40s} {metric:18s} {old:>12} -> {new:<12} ({change:+.1f}%){flag}")
+
+    for key in sorted(old_rows.keys() - new_rows.keys()):
+        print(f"[WARNING] Only in {args.old}: {key[0]} {key[1]}")
+    for key in sorted(new_rows.keys() - old_rows.keys()):
+        print(f"[WARNING] Only in {args.new}: {key[0]} {key[1]}")
+    print(f"[INFO] {regressions} regression(s) beyond {args.threshold}%")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
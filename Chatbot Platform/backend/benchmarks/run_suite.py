@@ -0,0 +1,89 @@
+"""
+Run the benchmark suite and collect every result in one JSON file.
+
+Each benchmark script runs in its own process with the arguments of the
+chosen profile: "quick" is a few-minute regression check, "full" uses each
+script's defaults. Data sets are generated from fixed seeds and the LLM is
+the stub server, so runs on one machine are comparable. The output records
+the commit and machine (see common.run_info). It goes to
+benchmarks/results/<commit>-<profile>.json by default; compare two such
+files with compare.py.
+
+Usage (from the backend directory):
+    python benchmarks/run_suite.py --profile quick
+    python benchmarks/run_suite.py --profile full --only pipeline serving
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from common import BACKEND_DIR, BENCH_DIR, run_info, write_results
+
+BENCHMARKS = {
+    "pipeline": "bench_pipeline.py",
+    "lexical": "bench_lexical.py",
+    "ann": "bench_ann.py",
+    "serving": "bench_serving.py",
+    "prefix_cache": "bench_prefix_cache.py",
+    "startup": "bench_startup.py",
+    "tenants": "bench_tenants.py",
+}
+
+PROFILES = {
+    "quick": {
+        "pipeline": ["--sizes", "1000", "--queries", "100"],
+        "lexical": ["--sizes", "10000", "--queries", "500"],
+        "ann": ["--sizes", "10000", "--queries", "200"],
+        "serving": ["--concurrency", "10", "50", "--requests", "200"],
+        "prefix_cache": ["--sessions", "5", "--turns", "3"],
+        "startup": ["--runs", "3"],
+        "tenants": ["--duration", "5"],
+    },
+    "full": {name: [] for name in BENCHMARKS},
+}
+
+def run_benchmark(name, args):
+    """Run one benchmark script; returns its results without the per-script run info."""
+    fd, path = tempfile.mkstemp(prefix=f"bench_{name}_", suffix=".json")
+    os.close(fd)
+    try:
+        print(f"[INFO] Running {name}: {' '.join([BENCHMARKS[name], *args])}")
+        proc = subprocess.run(
+            [sys.executable, os.path.join(BENCH_DIR, BENCHMARKS[name]), *args, "--output", path],
+            cwd=BACKEND_DIR,
+            env={**os.environ, "PYTHONHASHSEED": "0"},
+        )
+        if proc.returncode != 0:
+            print(f"[ERROR] {name} exited with status {proc.returncode}")
+            return {"benchmark": name, "error": f"exit status {proc.returncode}"}
+        with open(path) as f:
+            results = json.load(f)
+        results.pop("run", None)
+        return results
+    finally:
+        os.remove(path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", default="quick", choices=list(PROFILES))
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--output", help="JSON results file (default: benchmarks/results/<commit>-<profile>.json)")
+    args = parser.parse_args()
+
+    output = args.output
+    if output is None:
+        info = run_info()
+        label = (info["commit"] or "unknown")[:12] + ("-dirty" if info["dirty"] else "")
+        os.makedirs(os.path.join(BENCH_DIR, "results"), exist_ok=True)
+        output = os.path.join(BENCH_DIR, "results", f"{label}-{args.profile}.json")
+
+    results = {name: run_benchmark(name, PROFILES[args.profile][name]) for name in (args.only or BENCHMARKS)}
+    write_results(output, {"suite": args.profile, "benchmarks": results})
+    if any("error" in result for result in results.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Ollama-compatible stub server for benchmarks.
+
+Implements /api/chat and /api/generate (streaming and non-streaming) with a
+configurable prefill delay and per-token delay, so serving benchmarks
+measure the platform rather than the model.
+
+Like Ollama, the stub keeps the token sequences of its last few requests
+(one per slot) and only prefills the part of a new prompt that does not
+extend one of them. `prompt_eval_count` is the number of prefilled tokens,
+and GET /stats reports totals (POST /stats/reset clears them).
+
+Run with:  uvicorn --app-dir benchmarks stub_ollama:app --port 11500
+Env vars:  STUB_PREFILL_MS (default 200), STUB_PREFILL_TOKEN_MS (default 0),
+           STUB_TOKEN_MS (default 20), STUB_TOKENS (default 40),
+           STUB_CACHE_SLOTS (default 4)
+"""
+import asyncio
+import json
+import os
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+PREFILL_MS = float(os.environ.get("STUB_PREFILL_MS", "200"))
+PREFILL_TOKEN_MS = float(os.environ.get("STUB_PREFILL_TOKEN_MS", "0"))
+TOKEN_MS = float(os.environ.get("STUB_TOKEN_MS", "20"))
+NUM_TOKENS = int(os.environ.get("STUB_TOKENS", "40"))
+CACHE_SLOTS = int(os.environ.get("STUB_CACHE_SLOTS", "4"))
+
+app = FastAPI()
+
+cache_slots = []  # Token sequences held in the simulated KV cache, least recently used first
+stats = {"requests": 0, "prompt_tokens": 0, "prefill_tokens": 0, "cached_tokens": 0}
+
+def common_prefix(a, b):
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+def prefill(prompt_tokens):
+    """Number of prompt tokens not already in a cache slot; the prompt takes over the best slot."""
+    best, matched = None, 0
+    for slot in cache_slots:
+        n = common_prefix(slot, prompt_tokens)
+        if n > matched:
+            best, matched = slot, n
+    if best is not None:
+        cache_slots.remove(best)
+    elif len(cache_slots) >= CACHE_SLOTS:
+        cache_slots.pop(0)
+    cache_slots.append(prompt_tokens)
+
+    stats["requests"] += 1
+    stats["prompt_tokens"] += len(prompt_tokens)
+    stats["prefill_tokens"] += len(prompt_tokens) - matched
+    stats["cached_tokens"] += matched
+    return len(prompt_tokens) - matched
+
+def chat_tokens(messages):
+    tokens = []
+    for message in messages:
+        tokens += [f"<|{message.get('role')}|>", *message.get("content", "").split()]
+    return tokens + ["<|assistant|>"]
+
+async def respond(body, prompt_tokens, wrap):
+    """Reply for both APIs; wrap(token) builds the API-specific part of a streamed chunk."""
+    tokens = [f"tok{i} " for i in range(NUM_TOKENS)]
+    evaluated = prefill(prompt_tokens)
+    prefill_seconds = (PREFILL_MS + PREFILL_TOKEN_MS * evaluated) / 1000
+    # Generated tokens stay in the slot too, so the next turn can extend them
+    cache_slots[-1] = prompt_tokens + "".join(tokens).split()
+    counts = {"prompt_eval_count": evaluated, "eval_count": NUM_TOKENS}
+
+    if not body.get("stream", True):
+        await asyncio.sleep(prefill_seconds + TOKEN_MS * NUM_TOKENS / 1000)
+        return {"model": body.get("model"), **wrap("".join(tokens)), "done": True, **counts}
+
+    async def stream():
+        await asyncio.sleep(prefill_seconds)
+        for token in tokens:
+            yield json.dumps({"model": body.get("model"), **wrap(token), "done": False}) + "\n"
+            await asyncio.sleep(TOKEN_MS / 1000)
+        yield json.dumps({"model": body.get("model"), **wrap(""), "done": True, **counts}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.post("/api/generate")
+async def generate(request: Request):
+    body = await request.json()
+    return await respond(body, body.get("prompt", "").split(), lambda token: {"response": token})
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    body = await request.json()
+    return await respond(body, chat_tokens(body.get("messages", [])),
+                         lambda token: {"message": {"role": "assistant", "content": token}})
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+@app.post("/stats/reset")
+async def reset_stats():
+    cache_slots.clear()
+    for key in stats:
+        stats[key] = 0
+    return stats
@@ -0,0 +1,150 @@
+"""
+Bounded in-memory caches for the chat pipeline.
+
+TTLCache is a thread-safe LRU cache with per-entry time-to-live and hit/miss
+counters. It backs the query-embedding cache (normalized query -> vector)
+and the retrieval cache ((bot, index, normalized query) -> top-k hits).
+
+SizedLRUCache holds the lazily loaded bot indexes, bounded by entry count and
+total size so idle bots fall out of memory.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_query(text):
+    """Cache key for a user query: lowercased, whitespace-collapsed, outer punctuation stripped."""
+    return _WHITESPACE.sub(" ", text.lower()).strip(" \t\n?!.,;:")
+
+class TTLCache:
+    """LRU cache bounded by entry count, with entries expiring after `ttl` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = max(0, int(maxsize))
+        self.ttl = float(ttl)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value or None, refreshing its LRU position on a hit."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def discard_where(self, predicate):
+        """Drop every entry whose key matches predicate(key)."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+class SizedLRUCache:
+    """
+    LRU cache bounded by entry count and by the sum of per-entry sizes in bytes,
+    used for resident bot indexes. A max of 0 means unbounded.
+    """
+
+    def __init__(self, max_entries=0, max_bytes=0):
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.total_bytes = 0
+        self.loads = 0
+        self.evictions = 0
+        self._data = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """Return the value (refreshing its LRU position) or None."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, size):
+        with self._lock:
+            if key in self._data:
+                self.total_bytes -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self.total_bytes += size
+            self.loads += 1
+            # Evict least recently used entries, but always keep the one just added
+            while len(self._data) > 1 and (
+                (self.max_entries and len(self._data) > self.max_entries)
+                or (self.max_bytes and self.total_bytes > self.max_bytes)
+            ):
+                evicted_key, (_, evicted_size) = self._data.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+                print(f"[INFO] Evicted index for '{evicted_key}' from memory")
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return default
+            self.total_bytes -= entry[1]
+            return entry[0]
+
+    def sizes(self):
+        """key -> size in bytes, least recently used first."""
+        with self._lock:
+            return {key: size for key, (_, size) in self._data.items()}
+
+    def stats(self):
+        return {
+            "resident": len(self._data),
+            "max_entries": self.max_entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
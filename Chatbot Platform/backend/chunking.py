@@ -0,0 +1,176 @@
+"""
+Chunking of knowledge base documents for embedding.
+
+all-MiniLM-L6-v2 reads at most 256 word pieces and silently drops the
+rest, while tiny chunks (a lone phone number or "Yes") embed poorly and
+bloat the index. The chunkers aim for chunks of up to CHUNK_MAX_TOKENS,
+estimated with tokens.count_tokens and kept under 256 for headroom:
+
+- json_records: key-path-aware flattening of generic JSON. The scalar
+  fields of each object are grouped into one chunk, titled with the path
+  leading to it (list items are named by their title/name/code field), so
+  values keep labels such as "fees" or "eligibility".
+- split_text: windows of whole sentences with CHUNK_OVERLAP_TOKENS of
+  overlap, for PDF prose and over-long values.
+- table_rows: one chunk per table row, with the header row's labels in
+  front of the cells.
+
+CHUNKING=leaf restores one chunk per string leaf for generic JSON.
+"""
+import os
+import re
+
+from tokens import count_tokens
+
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", "40"))
+CHUNKING = os.environ.get("CHUNKING", "structured")  # "structured" or "leaf"
+
+TITLE_KEYS = ("title", "name", "code", "id", "question", "heading", "label")
+MAX_PATH_SEGMENTS = 4  # Deeper paths keep only their last segments
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+_HAS_DIGIT = re.compile(r"\d")
+
+def _word_runs(sentence, run_tokens):
+    """Split an over-long sentence into runs of words of about run_tokens each."""
+    run, tokens = [], 0
+    for word in sentence.split():
+        word_tokens = count_tokens(word)
+        if run and tokens + word_tokens > run_tokens:
+            yield " ".join(run), tokens
+            run, tokens = [], 0
+        run.append(word)
+        tokens += word_tokens
+    if run:
+        yield " ".join(run), tokens
+
+def split_text(text, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Split text into windows of whole sentences of at most max_tokens. Each window
+    starts with up to overlap_tokens of the previous one's last sentences.
+    """
+    text = text.strip()
+    if not text:
+        return []
+    if count_tokens(text) <= max_tokens:
+        return [text]
+
+    pieces = []
+    for sentence in _SENTENCE_BREAK.split(text):
+        sentence = " ".join(sentence.split())
+        if not sentence:
+            continue
+        tokens = count_tokens(sentence)
+        if tokens <= max_tokens:
+            pieces.append((sentence, tokens))
+        else:
+            pieces.extend(_word_runs(sentence, max(16, overlap_tokens)))
+
+    windows = []
+    current, current_tokens = [], 0
+    for piece, tokens in pieces:
+        if current and current_tokens + tokens > max_tokens:
+            windows.append(" ".join(p for p, _ in current))
+            carried, carried_tokens = [], 0
+            for p, t in reversed(current):
+                if carried_tokens + t > overlap_tokens:
+                    break
+                carried.insert(0, (p, t))
+                carried_tokens += t
+            if carried_tokens + tokens > max_tokens:
+                carried, carried_tokens = [], 0
+            current, current_tokens = carried, carried_tokens
+        current.append((piece, tokens))
+        current_tokens += tokens
+    if current:
+        windows.append(" ".join(p for p, _ in current))
+    return windows
+
+def _is_scalar(value):
+    return isinstance(value, (str, int, float, bool)) and str(value).strip() != ""
+
+def _scalar_text(value):
+    return " ".join(str(value).split())
+
+def _label(key):
+    return str(key).replace("_", " ").strip()
+
+def _line(key, value):
+    return f"{_label(key)}: {value}" if key is not None else value
+
+def _pack(lines, max_tokens, overlap_tokens):
+    """Join "label: value" lines with "; " into parts of at most max_tokens."""
+    parts, current, current_tokens = [], [], 0
+    for line in lines:
+        for piece in split_text(line, max_tokens, overlap_tokens):
+            tokens = count_tokens(piece) + 1
+            if current and current_tokens + tokens > max_tokens:
+                parts.append("; ".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        parts.append("; ".join(current))
+    return parts
+
+def _record(path, fields, title_key, max_tokens, overlap_tokens):
+    """Chunks for one object's scalar fields, titled with its key path."""
+    title = " > ".join(path[-MAX_PATH_SEGMENTS:])
+    lines = [_line(key, value) for key, value in fields if key != title_key]
+    if not lines:  # Only a title field: the path already says it
+        lines = [_line(key, value) for key, value in fields]
+    budget = max(16, max_tokens - count_tokens(title))
+    for part in _pack(lines, budget, min(overlap_tokens, budget // 2)):
+        metadata = {"title": title, "description": part, "phase": ""}
+        yield (f"{title}: {part}" if title else part), metadata
+
+def _walk(obj, path, max_tokens, overlap_tokens):
+    if isinstance(obj, dict):
+        fields, children = [], []
+        for key, value in obj.items():
+            if _is_scalar(value):
+                fields.append((key, _scalar_text(value)))
+            elif isinstance(value, list) and value and all(_is_scalar(item) for item in value):
+                fields.append((key, ", ".join(_scalar_text(item) for item in value)))
+            elif isinstance(value, (dict, list)):
+                children.append((key, value))
+
+        # An object is named in paths by its title-like field, e.g. "courses > CS-101"
+        title_key = next((key for key, _ in fields if str(key).lower() in TITLE_KEYS), None)
+        own_path = path + [dict(fields)[title_key]] if title_key is not None else path
+        if fields and not (children and len(fields) == 1 and title_key is not None):
+            yield from _record(own_path, fields, title_key, max_tokens, overlap_tokens)
+        for key, value in children:
+            yield from _walk(value, own_path + [_label(key)], max_tokens, overlap_tokens)
+    elif isinstance(obj, list):
+        # Loose values (unlabelled: the path is the title)
+        scalars = [_scalar_text(item) for item in obj if _is_scalar(item)]
+        if scalars:
+            yield from _record(path, [(None, ", ".join(scalars))], None, max_tokens, overlap_tokens)
+        for item in obj:
+            if isinstance(item, (dict, list)):
+                yield from _walk(item, path, max_tokens, overlap_tokens)
+    elif _is_scalar(obj):
+        yield from _record(path, [(None, _scalar_text(obj))], None, max_tokens, overlap_tokens)
+
+def json_records(data, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """(text, metadata) chunks of a generic JSON document: sibling scalar fields grouped per object."""
+    yield from _walk(data, [], max_tokens, overlap_tokens)
+
+def _is_header(row):
+    # Labels: every cell filled and no numbers (a data row almost always has some)
+    return all(cell and cell.strip() for cell in row) and not any(_HAS_DIGIT.search(cell) for cell in row)
+
+def table_rows(table, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """(text, title) per data row of an extracted table, cells labelled by the header row if there is one."""
+    rows = [[(cell or "").strip() for cell in row] for row in table if any(row)]
+    header = rows[0] if len(rows) > 1 and _is_header(rows[0]) else None
+    for row in rows[1:] if header else rows:
+        if header:
+            cells = [f"{label}: {cell}" for label, cell in zip(header, row) if cell]
+        else:
+            cells = [cell for cell in row]
+        title = row[0] or "Row"
+        for part in split_text(" | ".join(cells), max_tokens, overlap_tokens):
+            yield part, title
@@ -0,0 +1,76 @@
+"""
+Dynamic micro-batching for query embeddings.
+
+Chat requests each need a single query embedding. Instead of calling
+`model.encode` once per request, concurrent requests hand their query to an
+EmbeddingBatcher, which collects queries for up to `max_wait_ms` (or until
+`max_batch_size` are waiting), encodes them in one call and hands each caller
+its own vector back.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+class EmbeddingBatcher:
+    """Batch concurrent `encode` calls on a shared SentenceTransformer."""
+
+    def __init__(self, model, max_batch_size=32, max_wait_ms=5.0):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.queries = 0  # Total queries encoded
+        self.batches = 0  # Total encode calls made
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def encode(self, text):
+        """Return the float32 embedding for one text, batched with concurrent callers."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _ensure_started(self):
+        # Started lazily so the worker thread is created in the serving process (after any fork)
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Wait is over: still take whatever has already arrived
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self.model.encode(texts, batch_size=len(texts), show_progress_bar=False)
+                vectors = np.asarray(vectors, dtype='float32')
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.queries += len(batch)
+            self.batches += 1
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
@@ -0,0 +1,89 @@
+"""
+Deferred loading of the sentence embedding model.
+
+Importing sentence-transformers pulls in torch and transformers, which
+takes seconds. Loading the weights takes more. LazyEncoder defers both to
+the first encode() call, or to the warm-up thread that app.py starts, so
+the server can answer /health as soon as it is imported.
+
+EMBEDDING_BACKEND selects the sentence-transformers backend: "torch"
+(default), "onnx" or "openvino". ONNX / OpenVINO need the matching extra:
+    pip install "sentence-transformers[onnx]"
+EMBEDDING_MODEL_FILE picks a file within the model repo, for example one of
+the int8-quantized exports of all-MiniLM-L6-v2:
+    EMBEDDING_BACKEND=onnx EMBEDDING_MODEL_FILE=onnx/model_quint8_avx2.onnx
+If the chosen backend cannot be loaded, the torch model is used instead.
+Quantized vectors are close to, but not identical with, the torch ones.
+Rebuild a bot's knowledge base after switching backends to get the
+backend's full accuracy: each knowledge base records the identity() of the
+encoder that built it, and stored vectors are only reused by an encoder
+with the same identity.
+"""
+import threading
+import time
+
+class LazyEncoder:
+    """SentenceTransformer stand-in that loads the model on first use (thread-safe)."""
+
+    def __init__(self, model_name, backend="torch", model_file=None):
+        self.model_name = model_name
+        self.backend = backend
+        self.model_file = model_file
+        self.loaded_backend = None
+        self.load_seconds = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def load(self):
+        """Return the model, loading it first if needed (concurrent callers wait for one load)."""
+        if self._model is not None:
+            return self._model
+        with self._lock:
+            if self._model is None:
+                start = time.perf_counter()
+                from sentence_transformers import SentenceTransformer
+
+                model = None
+                if self.backend != "torch":
+                    model_kwargs = {"file_name": self.model_file} if self.model_file else None
+                    try:
+                        model = SentenceTransformer(self.model_name, backend=self.backend, model_kwargs=model_kwargs)
+                        self.loaded_backend = self.backend
+                    except Exception as e:
+                        print(f"[WARNING] Could not load the {self.backend} encoder ({e}); using torch instead")
+                if model is None:
+                    model = SentenceTransformer(self.model_name)
+                    self.loaded_backend = "torch"
+                self.load_seconds = time.perf_counter() - start
+                self._model = model
+                print(f"[INFO] Loaded embedding model '{self.model_name}' ({self.loaded_backend}) "
+                      f"in {self.load_seconds:.2f}s")
+        return self._model
+
+    def encode(self, *args, **kwargs):
+        return self.load().encode(*args, **kwargs)
+
+    def identity(self):
+        """What produced this encoder's vectors: model, loaded backend and model file (loads the model)."""
+        self.load()
+        return {
+            "model": self.model_name,
+            "backend": self.loaded_backend,
+            "model_file": self.model_file if self.loaded_backend != "torch" else None,
+        }
+
+    def get_sentence_embedding_dimension(self):
+        return self.load().get_sentence_embedding_dimension()
+
+    def stats(self):
+        return {
+            "model": self.model_name,
+            "loaded": self.loaded,
+            "backend": self.loaded_backend or self.backend,
+            "model_file": self.model_file,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+        }
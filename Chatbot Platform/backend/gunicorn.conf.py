@@ -0,0 +1,37 @@
+"""
+Multi-process serving.
+
+    gunicorn -c gunicorn.conf.py app:app
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker async_app:app
+
+The app is imported once in the master (preload_app, with WARMUP=preload so
+the embedding model is loaded then) and workers are forked from it, so the
+model's weights are shared copy-on-write instead of loaded once per worker.
+Each worker then warms its bot indexes in the background. FAISS indexes and chunk metadata are memory-mapped,
+so every worker reads the same page-cache copy. Chat sessions, themes and
+ingestion job status go to a SQLite file shared by all workers, and bot config
+changes made by one worker are picked up by the others on their next request.
+"""
+import multiprocessing
+import os
+import sys
+
+# Must be set before the app is imported
+os.environ.setdefault("SHARED_STATE_DB", "shared_state.db")
+os.environ.setdefault("WARMUP", "preload")  # No background threads in the master: they would not survive the fork
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))  # Per worker, for the sync (Flask) workers
+preload_app = True
+timeout = 300  # Long LLM calls and streamed answers
+
+def post_fork(server, worker):
+    # Split the cores between workers instead of every worker's torch using all of them
+    torch = sys.modules.get("torch")  # Already imported by the preloaded embedding model
+    if torch is not None:
+        torch.set_num_threads(max(1, multiprocessing.cpu_count() // workers))
+
+    core = sys.modules.get("app")  # The preloaded Flask app (also imported by async_app)
+    if core is not None and core.WARMUP == "preload":
+        core.start_warmup(load_model=False)
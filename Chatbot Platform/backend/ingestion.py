@@ -0,0 +1,119 @@
+"""
+Knowledge base extraction for process_uploaded_file.
+
+iter_file_chunks streams (text, metadata) pairs out of an uploaded file so
+the caller can embed and index them in batches instead of holding the whole
+corpus in memory. `progress` is an optional dict updated in place, which the
+ingestion job status endpoint reports.
+"""
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from chunking import CHUNKING, CHUNK_MAX_TOKENS, json_records, split_text
+from pdf_worker import extract_pdf_pages
+from tokens import count_tokens
+
+# --- PDF extraction config ---
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_SHARD = int(os.environ.get("PDF_PAGES_PER_SHARD", "8"))
+# Forking the server could copy a lock held by one of its threads (torch, the embedding
+# batcher, ingestion, warm-up) into a worker, so workers come from a fork server, a clean
+# process that preloads only pdf_worker; platforms without one (Windows) spawn them
+PDF_MP_CONTEXT = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+def iter_pdf_chunks(filepath, progress):
+    """
+    Extract tabular data from PDFs (employee transfers), sharding page ranges
+    across a process pool. Shards are yielded in page order, with at most two
+    shards per worker in flight.
+    """
+    import pdfplumber
+
+    with pdfplumber.open(filepath) as pdf:
+        num_pages = len(pdf.pages)
+    progress["pages_total"] = num_pages
+    progress["pages_done"] = 0
+
+    shards = [(start, min(start + PDF_PAGES_PER_SHARD, num_pages))
+              for start in range(0, num_pages, PDF_PAGES_PER_SHARD)]
+    workers = max(1, min(PDF_WORKERS, len(shards)))
+    started = time.perf_counter()
+
+    if workers == 1:
+        for start, stop in shards:
+            yield from extract_pdf_pages(filepath, start, stop)
+            progress["pages_done"] = stop
+    else:
+        context = multiprocessing.get_context(PDF_MP_CONTEXT)
+        if PDF_MP_CONTEXT == "forkserver":
+            context.set_forkserver_preload(["pdf_worker"])
+        with ProcessPoolExecutor(workers, mp_context=context) as pool:
+            shard_iter = iter(shards)
+            pending = deque(
+                (stop, pool.submit(extract_pdf_pages, filepath, start, stop))
+                for start, stop in islice(shard_iter, workers * 2)
+            )
+            while pending:
+                stop, future = pending.popleft()
+                chunks = future.result()
+                for start, next_stop in islice(shard_iter, 1):
+                    pending.append((next_stop, pool.submit(extract_pdf_pages, filepath, start, next_stop)))
+                yield from chunks
+                progress["pages_done"] = stop
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"[INFO] Extracted {num_pages} PDF pages in {elapsed:.2f}s "
+          f"({num_pages / elapsed:.1f} pages/sec, {workers} worker(s))")
+
+def iter_json_chunks(filepath, progress):
+    """
+    Extract `phases` nodes (long descriptions split into windows), or the
+    fields of any other JSON document grouped per object (see chunking.py).
+    """
+    with open(filepath, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    if "phases" in data:
+        for phase in data["phases"]:
+            phase_name = phase.get("phase", "")
+            for node in phase.get("nodes", []):
+                title = node.get("title", "")
+                budget = max(16, CHUNK_MAX_TOKENS - count_tokens(title))
+                for desc in split_text(node.get("description", ""), budget) or [""]:
+                    yield f"{title}: {desc}", {
+                        "title": title,
+                        "description": desc,
+                        "phase": phase_name
+                    }
+    elif CHUNKING == "leaf":
+        def extract_texts(obj):
+            if isinstance(obj, dict):
+                for v in obj.values():
+                    yield from extract_texts(v)
+            elif isinstance(obj, list):
+                for item in obj:
+                    yield from extract_texts(item)
+            elif isinstance(obj, str):
+                yield obj
+
+        for text in extract_texts(data):
+            yield text, {"title": "", "description": text, "phase": ""}
+    else:
+        yield from json_records(data)
+
+def iter_file_chunks(filepath, progress=None):
+    """Yield (text_to_embed, metadata) pairs from a knowledge base file."""
+    progress = progress if progress is not None else {}
+    ext = filepath.rsplit('.', 1)[-1].lower()
+
+    if ext == "pdf":
+        yield from iter_pdf_chunks(filepath, progress)
+    elif ext == "json":
+        yield from iter_json_chunks(filepath, progress)
+    else:
+        raise ValueError("Unsupported file format")
@@ -0,0 +1,203 @@
+"""
+Per-bot BM25 inverted index for exact-term retrieval.
+
+Embeddings blur exact tokens such as course codes, fee amounts and emails,
+so every knowledge base also gets a sparse index over the text of its chunks.
+Documents are the chunk rows, so lexical hits share FAISS ids and can be
+fused with vector hits.
+
+The index is written at ingest time into a single memory-mapped file:
+
+    magic | header length | JSON header | sections
+
+Terms are 64-bit hashes kept sorted, so a lookup is one np.searchsorted with
+no dictionary to build at load time. Each term's postings (doc id, term
+frequency, BM25 weight) are stored in descending weight order, so a query
+reads at most MAX_POSTINGS_PER_TERM postings per term however common the
+term is.
+"""
+import hashlib
+import json
+import math
+import mmap
+import re
+import struct
+from array import array
+from collections import Counter
+
+import numpy as np
+
+MAGIC = b"KBLEX001"
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_POSTINGS_PER_TERM = 2000
+
+# Emails, then words / numbers / codes joined by - . / , (e.g. "cs-101", "1,050", "www.juit.ac.in")
+_TOKENS = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+|\w+(?:[-./,]\w+)*")
+_PARTS = re.compile(r"\w+")
+_GROUPED_NUMBER = re.compile(r"\d{1,3}(?:,\d{3})+(?:\.\d+)?")
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from has have how i in is it its me my of on or please
+tell than that the their there this to was what when where which who why will with you your
+""".split())
+
+def tokenize(text):
+    """Index terms of a text; compound tokens are also indexed by their parts."""
+    terms = []
+    for token in _TOKENS.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(part for part in _PARTS.findall(token) if part not in STOPWORDS)
+            if _GROUPED_NUMBER.fullmatch(token):
+                terms.append(token.replace(",", ""))
+    return terms
+
+def term_hash(term):
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+def _align(n):
+    return (n + 7) & ~7
+
+class LexicalIndexBuilder:
+    """Accumulates postings for chunks added in FAISS id order and writes an index file."""
+
+    def __init__(self):
+        self._postings = {}  # term hash -> (doc ids, term frequencies)
+        self._doc_lengths = array("I")
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def add(self, text):
+        """Index the next chunk (its doc id is the number of chunks added before it)."""
+        doc_id = len(self._doc_lengths)
+        terms = tokenize(text)
+        self._doc_lengths.append(len(terms))
+        for term, tf in Counter(terms).items():
+            postings = self._postings.get(term_hash(term))
+            if postings is None:
+                postings = self._postings[term_hash(term)] = (array("I"), array("H"))
+            postings[0].append(doc_id)
+            postings[1].append(min(tf, 65535))
+
+    def extend(self, index):
+        """Start from every document of an existing LexicalIndex (call before add())."""
+        if len(self):
+            raise ValueError("extend() must be called on an empty builder")
+        self._doc_lengths.frombytes(index._doc_lengths.astype("<u4").tobytes())
+        for i, term in enumerate(index._terms.tolist()):
+            start, stop = int(index._offsets[i]), int(index._offsets[i + 1])
+            order = np.argsort(index._doc_ids[start:stop], kind="stable")
+            doc_ids = array("I", index._doc_ids[start:stop][order].astype("<u4").tobytes())
+            tfs = array("H", index._tfs[start:stop][order].astype("<u2").tobytes())
+            self._postings[term] = (doc_ids, tfs)
+
+    def write(self, path):
+        num_docs = len(self._doc_lengths)
+        doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32) if num_docs else np.zeros(0, np.uint32)
+        avg_length = max(float(doc_lengths.mean()), 1.0) if num_docs else 1.0
+        terms = sorted(self._postings)
+
+        offsets = np.zeros(len(terms) + 1, dtype="<u8")
+        idf = np.empty(len(terms), dtype="<f4")
+        doc_id_parts, tf_parts, weight_parts = [], [], []
+        for i, term in enumerate(terms):
+            doc_ids = np.frombuffer(self._postings[term][0], dtype=np.uint32)
+            tfs = np.frombuffer(self._postings[term][1], dtype=np.uint16).astype(np.float32)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[doc_ids] / avg_length)
+            weights = tfs * (BM25_K1 + 1) / (tfs + norm)
+            order = np.argsort(-weights, kind="stable")  # Impact order: best postings first
+            doc_id_parts.append(doc_ids[order])
+            tf_parts.append(tfs[order].astype(np.uint16))
+            weight_parts.append(weights[order].astype(np.float32))
+            offsets[i + 1] = offsets[i] + len(doc_ids)
+            df = len(doc_ids)
+            idf[i] = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+
+        sections = {
+            "terms": np.array(terms, dtype="<u8").tobytes(),
+            "offsets": offsets.tobytes(),
+            "idf": idf.tobytes(),
+            "doc_ids": np.concatenate(doc_id_parts or [np.zeros(0, np.uint32)]).astype("<u4").tobytes(),
+            "tfs": np.concatenate(tf_parts or [np.zeros(0, np.uint16)]).astype("<u2").tobytes(),
+            "weights": np.concatenate(weight_parts or [np.zeros(0, np.float32)]).astype("<f4").tobytes(),
+            "doc_lengths": doc_lengths.astype("<u4").tobytes(),
+        }
+        header = {"num_docs": num_docs, "num_terms": len(terms), "num_postings": int(offsets[-1]), "sections": {}}
+        position = 0
+        for name, payload in sections.items():
+            header["sections"][name] = position
+            position = _align(position + len(payload))
+
+        header_bytes = json.dumps(header).encode("utf-8")
+        base = _align(len(MAGIC) + 8 + len(header_bytes))
+        with open(path, "wb") as f:
+            f.write(MAGIC + struct.pack("<Q", len(header_bytes)) + header_bytes)
+            for name, payload in sections.items():
+                f.seek(base + header["sections"][name])
+                f.write(payload)
+
+class LexicalIndex:
+    """Read-only, memory-mapped BM25 index."""
+
+    _DTYPES = {"terms": "<u8", "offsets": "<u8", "idf": "<f4", "doc_ids": "<u4",
+               "tfs": "<u2", "weights": "<f4", "doc_lengths": "<u4"}
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a lexical index: {path}")
+        (header_len,) = struct.unpack_from("<Q", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 8
+        header = json.loads(self._mmap[start:start + header_len])
+        base = _align(start + header_len)
+
+        self.num_docs = header["num_docs"]
+        counts = {"terms": header["num_terms"], "offsets": header["num_terms"] + 1, "idf": header["num_terms"],
+                  "doc_ids": header["num_postings"], "tfs": header["num_postings"],
+                  "weights": header["num_postings"], "doc_lengths": self.num_docs}
+        for name, offset in header["sections"].items():
+            view = np.frombuffer(self._mmap, dtype=self._DTYPES[name], count=counts[name], offset=base + offset)
+            setattr(self, f"_{name}", view)
+        # Weight of a query term that no chunk contains (the rarest possible term)
+        self._unknown_idf = math.log(1 + (self.num_docs + 0.5) / 0.5)
+
+    def __len__(self):
+        return self.num_docs
+
+    def search(self, query, k):
+        """
+        BM25 top-k for a query. Returns (doc_ids, scores, coverage) arrays, best first;
+        coverage is the share of the query's IDF mass (terms not in the index
+        count as maximally rare) that each document contains.
+        """
+        hashes = np.array(sorted({term_hash(term) for term in tokenize(query)}), dtype=np.uint64)
+        empty = (np.zeros(0, np.int64), np.zeros(0, np.float32), np.zeros(0, np.float32))
+        if not len(hashes) or not len(self._terms):
+            return empty
+
+        positions = np.minimum(np.searchsorted(self._terms, hashes), len(self._terms) - 1)
+        found = positions[self._terms[positions] == hashes]
+        total_idf = float(self._idf[found].sum()) + (len(hashes) - len(found)) * self._unknown_idf
+        if not len(found):
+            return empty
+
+        doc_ids, weights, idfs = [], [], []
+        for position in found:
+            start = int(self._offsets[position])
+            stop = min(int(self._offsets[position + 1]), start + MAX_POSTINGS_PER_TERM)
+            idf = float(self._idf[position])
+            doc_ids.append(self._doc_ids[start:stop])
+            weights.append(self._weights[start:stop] * idf)
+            idfs.append(np.full(stop - start, idf, dtype=np.float32))
+
+        docs, inverse = np.unique(np.concatenate(doc_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights))
+        matched = np.bincount(inverse, weights=np.concatenate(idfs))
+        top = np.argpartition(-scores, k)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return docs[top].astype(np.int64), scores[top].astype(np.float32), (matched[top] / total_idf).astype(np.float32)
@@ -0,0 +1,398 @@
+"""
+Clients for Ollama's chat API.
+
+LLMClient (requests, for the Flask app) and AsyncLLMClient (aiohttp, for
+async_app.py) share the same behaviour:
+- one pooled HTTP session per process, with separate connect / read timeouts
+- requests go round-robin over one or more Ollama endpoints; connection
+  failures and 5xx answers are retried on the next endpoint
+- at most `max_in_flight` requests run at once. Up to `max_queue` more wait
+  for a slot, for at most `queue_timeout` seconds. Beyond that, LLMOverloaded
+  is raised at once so the route can answer 503 instead of piling up work.
+- waiting requests are served by weighted fair queuing across tenants
+  (bots): each request gets a virtual finish time of
+  max(now, tenant's last finish) + 1 / weight, and a free slot goes to the
+  smallest one. A flooding bot then waits behind its own backlog while other
+  bots keep their share, in proportion to their weights. One tenant may hold
+  at most `max_queue_per_tenant` of the queue.
+
+stats() reports in-flight and queued requests (per tenant too) plus request,
+retry, error and shed counters.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import threading
+import time
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_BACKOFF = 0.1  # Seconds before the first retry, doubled for each further retry
+
+class LLMError(Exception):
+    """The LLM request failed; the message is suitable for showing to the user."""
+
+class LLMOverloaded(LLMError):
+    """Too many LLM requests are already running or queued."""
+
+class _Limiter:
+    """Fair-queuing bookkeeping shared by the thread and asyncio concurrency limiters."""
+
+    def __init__(self, max_in_flight, max_queue, queue_timeout, max_queue_per_tenant=None):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_queue = max(0, int(max_queue))
+        self.max_queue_per_tenant = self.max_queue if max_queue_per_tenant is None else max(0, int(max_queue_per_tenant))
+        self.queue_timeout = float(queue_timeout)
+        self.in_flight = 0
+        self.shed = 0
+        self.virtual_time = 0.0
+        self._finish = {}   # tenant -> virtual finish time of its last request
+        self._waiting = []  # heap of [finish time, sequence number, tenant]
+        self._seq = itertools.count()
+        self.queued_by_tenant = {}
+
+    @property
+    def queued(self):
+        return len(self._waiting)
+
+    def _enqueue(self, tenant, weight):
+        """Queue a request, or raise LLMOverloaded if the queue (or the tenant's share of it) is full."""
+        if self.in_flight >= self.max_in_flight and (
+                self.queued >= self.max_queue or self.queued_by_tenant.get(tenant, 0) >= self.max_queue_per_tenant):
+            self.shed += 1
+            raise LLMOverloaded("The model is busy, please retry shortly.")
+        finish = max(self.virtual_time, self._finish.get(tenant, 0.0)) + 1.0 / max(float(weight), 1e-3)
+        self._finish[tenant] = finish
+        ticket = [finish, next(self._seq), tenant]
+        heapq.heappush(self._waiting, ticket)
+        self.queued_by_tenant[tenant] = self.queued_by_tenant.get(tenant, 0) + 1
+        return ticket
+
+    def _can_start(self, ticket):
+        return self.in_flight < self.max_in_flight and self._waiting[0] is ticket
+
+    def _dequeue(self, ticket):
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        count = self.queued_by_tenant[ticket[2]] - 1
+        if count:
+            self.queued_by_tenant[ticket[2]] = count
+        else:
+            del self.queued_by_tenant[ticket[2]]
+
+    def _start(self, ticket):
+        self._dequeue(ticket)
+        self.virtual_time = max(self.virtual_time, ticket[0])
+        self.in_flight += 1
+
+    def _timed_out(self):
+        self.shed += 1
+        return LLMOverloaded("The model is busy, please retry shortly.")
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "queued_by_tenant": {str(tenant): count for tenant, count in self.queued_by_tenant.items()},
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "max_queue_per_tenant": self.max_queue_per_tenant,
+            "shed": self.shed,
+        }
+
+class ConcurrencyLimiter(_Limiter):
+    """Bounded concurrency with a bounded, fair wait queue, for threads."""
+
+    def __init__(self, max_in_flight, max_queue, queue_timeout, max_queue_per_tenant=None):
+        super().__init__(max_in_flight, max_queue, queue_timeout, max_queue_per_tenant)
+        self._cond = threading.Condition()
+
+    def acquire(self, tenant=None, weight=1.0):
+        with self._cond:
+            ticket = self._enqueue(tenant, weight)
+            try:
+                if not self._cond.wait_for(lambda: self._can_start(ticket), self.queue_timeout):
+                    raise self._timed_out()
+            except BaseException:
+                self._dequeue(ticket)
+                self._cond.notify_all()
+                raise
+            self._start(ticket)
+            # Waiters check whether they are now at the head of the queue
+            self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+class AsyncConcurrencyLimiter(_Limiter):
+    """Bounded concurrency with a bounded, fair wait queue, for asyncio tasks."""
+
+    def __init__(self, max_in_flight, max_queue, queue_timeout, max_queue_per_tenant=None):
+        super().__init__(max_in_flight, max_queue, queue_timeout, max_queue_per_tenant)
+        self._cond = asyncio.Condition()
+
+    async def acquire(self, tenant=None, weight=1.0):
+        async with self._cond:
+            ticket = self._enqueue(tenant, weight)
+            try:
+                await asyncio.wait_for(self._cond.wait_for(lambda: self._can_start(ticket)), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._dequeue(ticket)
+                self._cond.notify_all()
+                raise self._timed_out()
+            except BaseException:
+                self._dequeue(ticket)
+                self._cond.notify_all()
+                raise
+            self._start(ticket)
+            self._cond.notify_all()
+
+    async def release(self):
+        # Free the slot before any await: a release cancelled while waiting for the
+        # lock (e.g. the client disconnected) must not lose it
+        self.in_flight -= 1
+        await asyncio.shield(self._notify())
+
+    async def _notify(self):
+        async with self._cond:
+            self._cond.notify_all()
+
+class _Endpoints:
+    """Round-robin over the configured Ollama URLs with per-endpoint counters."""
+
+    def __init__(self, urls):
+        self.urls = list(urls)
+        self._cycle = itertools.cycle(range(len(self.urls)))
+        self._lock = threading.Lock()
+        self.requests = {url: 0 for url in self.urls}
+        self.errors = {url: 0 for url in self.urls}
+        self.retries = 0
+
+    def take(self, attempts):
+        """URLs to try for one request: the next endpoint in turn, then the ones after it."""
+        with self._lock:
+            start = next(self._cycle)
+        return [self.urls[(start + i) % len(self.urls)] for i in range(attempts)]
+
+    # Counters are bumped from many request threads: under the lock, or increments get lost
+    def count_request(self, url, retry=False):
+        with self._lock:
+            self.requests[url] += 1
+            if retry:
+                self.retries += 1
+
+    def count_error(self, url):
+        with self._lock:
+            self.errors[url] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "endpoints": [{"url": url, "requests": self.requests[url], "errors": self.errors[url]}
+                              for url in self.urls],
+                "retries": self.retries,
+            }
+
+class LLMStream:
+    """Iterator over the JSON chunks of a streamed reply; holds a concurrency slot until closed."""
+
+    def __init__(self, resp, release):
+        self._resp = resp
+        self._release = release
+
+    def __iter__(self):
+        try:
+            for line in self._resp.iter_lines():
+                if line:
+                    yield json.loads(line)
+        except requests.RequestException as e:
+            raise LLMError(f"Ollama stream failed: {str(e)}")
+        finally:
+            self.close()
+
+    def close(self):
+        release, self._release = self._release, None
+        if release is not None:
+            self._resp.close()
+            release()
+
+    def __del__(self):
+        # A stream that was never iterated still gives its slot back
+        self.close()
+
+class AsyncLLMStream:
+    """
+    Async iterator over the JSON chunks of a streamed reply; holds a concurrency slot
+    until aclose(), which the owner must await even if the stream was never iterated.
+    """
+
+    def __init__(self, resp, release):
+        self._resp = resp
+        self._release = release
+        self._loop = asyncio.get_running_loop()
+
+    async def __aiter__(self):
+        try:
+            async for line in self._resp.content:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise LLMError(f"Ollama stream failed: {str(e)}")
+        finally:
+            await self.aclose()
+
+    async def aclose(self):
+        release, self._release = self._release, None
+        if release is not None:
+            self._resp.release()
+            await release()
+
+    def __del__(self):
+        # Last resort for a stream its owner never closed: give the slot back on the loop
+        release, self._release = self._release, None
+        if release is not None and not self._loop.is_closed():
+            self._resp.release()
+            self._loop.call_soon_threadsafe(lambda: self._loop.create_task(release()))
+
+class LLMClient:
+    """Pooled, rate-limited client for Ollama's chat API (blocking)."""
+
+    def __init__(self, urls, max_in_flight=8, max_queue=64, queue_timeout=30,
+                 connect_timeout=5, read_timeout=300, retries=2, max_queue_per_tenant=None):
+        self.endpoints = _Endpoints(urls)
+        self.limiter = ConcurrencyLimiter(max_in_flight, max_queue, queue_timeout, max_queue_per_tenant)
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = max(0, int(retries))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.endpoints.urls), pool_maxsize=self.limiter.max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, payload, stream):
+        """POST to the endpoints in turn until one answers; connection failures and 5xx are retried."""
+        error = None
+        for attempt, url in enumerate(self.endpoints.take(self.retries + 1)):
+            if attempt:
+                time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+            self.endpoints.count_request(url, retry=bool(attempt))
+            try:
+                resp = self.session.post(url, json=payload, stream=stream, timeout=self.timeout)
+            except requests.ConnectionError as e:  # Includes connect timeouts
+                self.endpoints.count_error(url)
+                error = LLMError(f"Ollama connection failed: {str(e)}")
+                continue
+            except requests.RequestException as e:  # Read timeouts are not retried: the model was busy with it
+                self.endpoints.count_error(url)
+                raise LLMError(f"Ollama request failed: {str(e)}")
+            if resp.status_code == 200:
+                return resp
+            self.endpoints.count_error(url)
+            error = LLMError(f"Ollama error {resp.status_code}: {resp.text}")
+            resp.close()
+            if resp.status_code < 500:
+                break
+        raise error
+
+    def chat(self, payload, tenant=None, weight=1.0):
+        """Return the JSON reply of a non-streamed chat request, queued fairly among `tenant`s by `weight`."""
+        self.limiter.acquire(tenant, weight)
+        try:
+            return self._post(payload, False).json()
+        except requests.RequestException as e:
+            raise LLMError(f"Ollama request failed: {str(e)}")
+        finally:
+            self.limiter.release()
+
+    def stream_chat(self, payload, tenant=None, weight=1.0):
+        """
+        Start a streamed chat request and return an LLMStream. The concurrency slot
+        is taken (or LLMOverloaded raised) before this returns.
+        """
+        self.limiter.acquire(tenant, weight)
+        try:
+            resp = self._post(payload, True)
+        except Exception:
+            self.limiter.release()
+            raise
+        return LLMStream(resp, self.limiter.release)
+
+    def stats(self):
+        return {**self.limiter.stats(), **self.endpoints.stats()}
+
+class AsyncLLMClient:
+    """Pooled, rate-limited client for Ollama's chat API (asyncio). Call start() inside the event loop."""
+
+    def __init__(self, urls, max_in_flight=8, max_queue=64, queue_timeout=30,
+                 connect_timeout=5, read_timeout=300, retries=2, max_queue_per_tenant=None, max_connections=256):
+        self.endpoints = _Endpoints(urls)
+        self.limiter = AsyncConcurrencyLimiter(max_in_flight, max_queue, queue_timeout, max_queue_per_tenant)
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+        self.retries = max(0, int(retries))
+        self.max_connections = max_connections
+        self.session = None
+
+    async def start(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_connections), timeout=self.timeout)
+
+    async def close(self):
+        await self.session.close()
+
+    async def _post(self, payload):
+        """Async version of LLMClient._post; the caller must release the response."""
+        error = None
+        for attempt, url in enumerate(self.endpoints.take(self.retries + 1)):
+            if attempt:
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+            self.endpoints.count_request(url, retry=bool(attempt))
+            try:
+                resp = await self.session.post(url, json=payload)
+            except (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError) as e:
+                self.endpoints.count_error(url)
+                error = LLMError(f"Ollama connection failed: {str(e)}")
+                continue
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.endpoints.count_error(url)
+                raise LLMError(f"Ollama request failed: {str(e)}")
+            if resp.status == 200:
+                return resp
+            self.endpoints.count_error(url)
+            error = LLMError(f"Ollama error {resp.status}: {await resp.text()}")
+            resp.release()
+            if resp.status < 500:
+                break
+        raise error
+
+    async def chat(self, payload, tenant=None, weight=1.0):
+        """Return the JSON reply of a non-streamed chat request, queued fairly among `tenant`s by `weight`."""
+        await self.limiter.acquire(tenant, weight)
+        try:
+            resp = await self._post(payload)
+            async with resp:
+                return await resp.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise LLMError(f"Ollama request failed: {str(e)}")
+        finally:
+            await self.limiter.release()
+
+    async def stream_chat(self, payload, tenant=None, weight=1.0):
+        """
+        Start a streamed chat request and return an AsyncLLMStream. The concurrency
+        slot is taken (or LLMOverloaded raised) before this returns.
+        """
+        await self.limiter.acquire(tenant, weight)
+        try:
+            resp = await self._post(payload)
+        except BaseException:  # Includes cancellation while waiting for Ollama
+            await self.limiter.release()
+            raise
+        return AsyncLLMStream(resp, self.limiter.release)
+
+    def stats(self):
+        return {**self.limiter.stats(), **self.endpoints.stats()}
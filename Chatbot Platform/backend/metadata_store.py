@@ -0,0 +1,128 @@
+"""
+Columnar chunk metadata store.
+
+A knowledge base's chunk metadata is written once at ingest time into a
+single file that is memory-mapped at serve time:
+
+    magic | header length | JSON header | column sections
+
+Each text column (title, phase, snippet) is a uint64 offset array plus a
+UTF-8 arena, so entry i (= FAISS id i) is one slice with nothing to unpickle.
+Chunk hashes are a fixed-width column of raw SHA-1 digests. `snippet` is the
+context line used in prompts, rendered at ingest time; it already contains
+the description, which is therefore not stored separately.
+"""
+import json
+import mmap
+import struct
+from array import array
+
+import numpy as np
+
+MAGIC = b"KBMETA01"
+TEXT_COLUMNS = ("title", "phase", "snippet")
+HASH_SIZE = 20           # Raw SHA-1 digest bytes
+NO_HASH = bytes(HASH_SIZE)  # Entries migrated from stores without hashes
+
+def render_snippet(metadata):
+    """Context line for a chunk: "title (Phase: x): description", or just the description."""
+    phase = f" (Phase: {metadata.get('phase')})" if metadata.get('phase') else ""
+    title = (metadata.get("title") or "").strip()
+    desc = (metadata.get("description") or "").strip()
+    return f"{title}{phase}: {desc}" if title else desc
+
+def _align(n):
+    return (n + 7) & ~7
+
+class MetadataWriter:
+    """Accumulates chunk metadata in column arenas and writes a store file."""
+
+    def __init__(self):
+        self._offsets = {column: array("Q", [0]) for column in TEXT_COLUMNS}
+        self._data = {column: bytearray() for column in TEXT_COLUMNS}
+        self._hashes = bytearray()
+
+    def __len__(self):
+        return len(self._hashes) // HASH_SIZE
+
+    def add(self, metadata, digest=None):
+        """Add one chunk's metadata dict and the hex SHA-1 of its text."""
+        values = {**metadata, "snippet": render_snippet(metadata)}
+        for column in TEXT_COLUMNS:
+            data = self._data[column]
+            data += str(values.get(column) or "").encode("utf-8")
+            self._offsets[column].append(len(data))
+        self._hashes += bytes.fromhex(digest) if digest else NO_HASH
+
+    def extend(self, store):
+        """Copy every entry of an existing MetadataStore, keeping their order."""
+        for column in TEXT_COLUMNS:
+            offsets, data = store._columns[column]
+            base = len(self._data[column])
+            self._data[column] += data
+            self._offsets[column].frombytes((offsets[1:] + np.uint64(base)).astype("<u8").tobytes())
+        self._hashes += store._hashes
+
+    def write(self, path):
+        header = {"count": len(self), "columns": {}}
+        sections = []
+        position = 0
+        for column in TEXT_COLUMNS:
+            offsets = self._offsets[column].tobytes()
+            data = bytes(self._data[column])
+            header["columns"][column] = [position, _align(position + len(offsets)), len(data)]
+            sections += [(position, offsets), (header["columns"][column][1], data)]
+            position = _align(header["columns"][column][1] + len(data))
+        header["hashes"] = position
+        sections.append((position, bytes(self._hashes)))
+
+        header_bytes = json.dumps(header).encode("utf-8")
+        base = _align(len(MAGIC) + 8 + len(header_bytes))
+        with open(path, "wb") as f:
+            f.write(MAGIC + struct.pack("<Q", len(header_bytes)) + header_bytes)
+            for offset, payload in sections:
+                f.seek(base + offset)
+                f.write(payload)
+
+class MetadataStore:
+    """Read-only, memory-mapped view of a store file with random access by FAISS id."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a metadata store: {path}")
+        (header_len,) = struct.unpack_from("<Q", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 8
+        header = json.loads(self._mmap[start:start + header_len])
+        base = _align(start + header_len)
+        view = memoryview(self._mmap)
+
+        self.count = header["count"]
+        self._columns = {}
+        for column, (offsets_at, data_at, data_len) in header["columns"].items():
+            offsets = np.frombuffer(self._mmap, dtype="<u8", count=self.count + 1, offset=base + offsets_at)
+            self._columns[column] = (offsets, view[base + data_at:base + data_at + data_len])
+        self._hashes = view[base + header["hashes"]:base + header["hashes"] + self.count * HASH_SIZE]
+
+    def __len__(self):
+        return self.count
+
+    def value(self, column, i):
+        offsets, data = self._columns[column]
+        return str(data[offsets[i]:offsets[i + 1]], "utf-8")
+
+    def snippet(self, i):
+        return self.value("snippet", i)
+
+    def record(self, i):
+        return {column: self.value(column, i) for column in TEXT_COLUMNS}
+
+    def hash_rows(self):
+        """Hex chunk hash -> row for every entry that has one."""
+        rows = {}
+        for i in range(self.count):
+            digest = self._hashes[i * HASH_SIZE:(i + 1) * HASH_SIZE]
+            if digest != NO_HASH:
+                rows[digest.hex()] = i
+        return rows
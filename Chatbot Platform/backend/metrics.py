@@ -0,0 +1,162 @@
+"""
+Latency instrumentation for the chat pipeline.
+
+A StageTimer records how long each stage of one chat request took (index
+load, query embedding, vector and lexical search, prompt build, LLM time to
+first token and total, serialization). When the request finishes, the
+durations are added to StageHistograms: one fixed-bucket histogram per
+(bot, stage). render_prometheus() prints them, plus any gauges, in the
+Prometheus text format served on /metrics.
+
+With several worker processes, each worker writes its histogram snapshot
+to a shared SQLiteDict at most every `flush_interval` seconds, and
+merged() sums the snapshots of all workers. The counts therefore stay
+cumulative across workers.
+"""
+import bisect
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Upper bounds in seconds: sub-millisecond searches up to multi-second LLM replies
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+           0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+class StageHistograms:
+    """Per (bot, stage) latency histograms of this process, optionally shared with other workers."""
+
+    def __init__(self, buckets=BUCKETS, store=None, flush_interval=5.0):
+        self.buckets = tuple(buckets)
+        self.store = store
+        self.flush_interval = float(flush_interval)
+        self._data = {}  # (bot, stage) -> [count per bucket..., overflow count, sum]
+        self._lock = threading.Lock()
+        self._flushed_at = 0.0
+        self._worker = None
+
+    def observe(self, bot_name, stage, seconds):
+        slot = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            entry = self._data.get((bot_name, stage))
+            if entry is None:
+                entry = self._data[(bot_name, stage)] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[slot] += 1
+            entry[-1] += seconds
+        if self.store is not None and time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def snapshot(self):
+        """JSON-serializable copy: {"bot\\tstage": [bucket counts..., sum]}."""
+        with self._lock:
+            return {f"{bot}\t{stage}": list(entry) for (bot, stage), entry in self._data.items()}
+
+    def _worker_key(self):
+        # pid plus a random suffix: a restarted worker never overwrites a dead one's counts
+        if self._worker is None or self._worker[0] != os.getpid():
+            self._worker = (os.getpid(), f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        return self._worker[1]
+
+    def flush(self):
+        """Publish this worker's snapshot to the shared store."""
+        self._flushed_at = time.monotonic()
+        self.store[self._worker_key()] = self.snapshot()
+
+    def merged(self):
+        """Histograms summed over every worker (just this process without a shared store)."""
+        if self.store is None:
+            return self.snapshot()
+        self.flush()
+        total = {}
+        for _, snapshot in self.store.items():
+            for key, entry in snapshot.items():
+                if len(entry) != len(self.buckets) + 2:
+                    continue  # Written with a different bucket layout
+                current = total.setdefault(key, [0] * len(entry))
+                for i, value in enumerate(entry):
+                    current[i] += value
+        return total
+
+class StageTimer:
+    """Stage durations of one chat request; finish() adds them to the histograms."""
+
+    def __init__(self, histograms=None, bot_name=None):
+        self.histograms = histograms
+        self.bot_name = bot_name
+        self.stages = {}  # stage -> seconds, in the order the stages ran
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def finish(self):
+        """Record the whole request's time as the "request" stage and observe every stage (once)."""
+        if self.histograms is None:
+            return
+        self.record("request", time.perf_counter() - self.started)
+        for name, seconds in self.stages.items():
+            self.histograms.observe(self.bot_name, name, seconds)
+        self.histograms = None
+
+    def breakdown(self):
+        """Stage durations in milliseconds."""
+        return {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+
+    def server_timing(self):
+        """Value for a Server-Timing response header (shown by browser dev tools)."""
+        return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items())
+
+def process_rss_bytes():
+    """Resident memory of this process, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+               for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render_prometheus(histograms, buckets=BUCKETS, metrics=()):
+    """
+    Prometheus text format for merged stage histograms, followed by `metrics`:
+    (name, type, help, [(labels dict, value), ...]) tuples for gauges and counters.
+    """
+    name = "chatbot_stage_duration_seconds"
+    lines = [f"# HELP {name} Time spent in each stage of a chat request.", f"# TYPE {name} histogram"]
+    for key in sorted(histograms):
+        bot_name, stage = key.split("\t", 1)
+        entry = histograms[key]
+        labels = {"bot": bot_name, "stage": stage}
+        cumulative = 0
+        for bound, count in zip(buckets, entry):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': repr(bound)})} {cumulative}")
+        cumulative += entry[len(buckets)]
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(float(entry[-1]))}")
+        lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+
+    for metric_name, metric_type, help_text, samples in metrics:
+        lines.append(f"# HELP {metric_name} {help_text}")
+        lines.append(f"# TYPE {metric_name} {metric_type}")
+        for labels, value in samples:
+            if value is not None:
+                lines.append(f"{metric_name}{_labels(labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
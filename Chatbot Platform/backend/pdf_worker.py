@@ -0,0 +1,35 @@
+"""
+PDF page extraction, run in the process pool of ingestion.iter_pdf_chunks.
+
+Kept apart from ingestion and the app so that a worker process imports only
+pdfplumber and the chunkers, never the server, its model or its threads.
+"""
+from chunking import split_text, table_rows
+
+def _page_chunks(page):
+    """
+    Chunks from one PDF page: a chunk per table row, or overlapping windows
+    of the page text if it has no tables.
+    """
+    chunks = []
+    for table in page.extract_tables():
+        for row_text, title in table_rows(table):
+            chunks.append((row_text, {"title": title, "description": row_text, "phase": ""}))
+
+    # Prose pages have no tables: fall back to plain text extraction
+    if not chunks:
+        for text in split_text(page.extract_text() or ""):
+            chunks.append((text, {"title": f"Page {page.page_number}", "description": text, "phase": ""}))
+    return chunks
+
+def extract_pdf_pages(filepath, start, stop):
+    """Extract chunks from pages [start, stop) of a PDF (runs in a worker process)."""
+    import pdfplumber  # Imported on first use: only PDF uploads need it
+
+    chunks = []
+    with pdfplumber.open(filepath) as pdf:
+        for page in pdf.pages[start:stop]:
+            chunks.extend(_page_chunks(page))
+            # Drop pdfplumber's cached layout objects so memory stays bounded
+            page.close()
+    return chunks
@@ -0,0 +1,114 @@
+"""
+Token-budgeted prompt assembly for Ollama's chat API.
+
+Messages are ordered so the prompt starts with a stable prefix, which
+Ollama keeps in its KV cache between requests:
+
+    system (instructions + bot role, identical for every chat with the bot)
+    earlier turns of the conversation (bare queries and answers)
+    user: retrieved knowledge base context + the new query
+
+Only the last message carries the retrieved context; the session history
+stores the bare query. So the previous turn's user message is not the one
+the model saw last time, and a follow-up reuses the cache for the system
+prompt and the turns before the previous one only: the previous exchange
+and the new message are prefilled again. Once the history is trimmed,
+dropping its oldest messages shifts everything after the system prompt.
+
+Retrieved chunks arrive in relevance order. Near-duplicates of a more
+relevant chunk are dropped, then chunks are added until the context budget
+is spent. Conversation history only gets the tokens left over in the prompt
+budget, so it is trimmed (oldest messages first) before any context is.
+"""
+import re
+
+from session_store import trim_history
+from tokens import count_message_tokens, count_tokens
+
+SYSTEM_TEMPLATE = """You are a smart, friendly, and unisex digital assistant. You're always helpful, respectful, and clear — like a real human guide.
+
+You specialize in this area: {role}
+
+Use ONLY the information from the knowledge base sent with each query to answer the user's query. If something is missing or unclear, say so politely and offer to help further.
+
+Speak in a natural, kind, and warm tone — not robotic or overly formal. Be conversational.
+
+Make sure to:
+- Greet the user warmly and acknowledge their query.
+- Give complete, accurate, and contextually relevant answers based on the knowledge base.
+- Never confuse things like emails and URLs — explain them correctly.
+- Avoid guessing. If something is unclear, say so and suggest a next step.
+- If the context is incomplete, ask helpful follow-up questions such as:
+  • "Would you like me to explain more about that?"
+  • "Are you looking for eligibility details, steps, or deadlines?"
+  • "Do you want a direct link or a summarized overview?"
+
+Remember:
+→ If you cannot find the answer in the knowledge base, say: "I'm not fully sure based on the available info. Would you like me to guide you another way?"
+
+Respond to the user naturally and helpfully — like a smart assistant who cares about solving their problem."""
+
+QUERY_TEMPLATE = """Knowledge Base:
+{kb_context}
+---
+User Query:
+{user_query}"""
+
+DUPLICATE_THRESHOLD = 0.9  # Word-set Jaccard similarity above which a chunk counts as a duplicate
+
+_WORDS = re.compile(r"\w+")
+
+def dedupe_chunks(chunks, threshold=DUPLICATE_THRESHOLD):
+    """Drop chunks that are near-duplicates of an earlier (more relevant) one."""
+    kept, kept_words = [], []
+    for chunk in chunks:
+        words = set(_WORDS.findall(chunk.lower()))
+        if any(len(words & other) >= threshold * len(words | other) for other in kept_words):
+            continue
+        kept.append(chunk)
+        kept_words.append(words)
+    return kept
+
+def select_context(chunks, token_budget):
+    """The most relevant chunks that fit the budget, skipping any single chunk too long to fit."""
+    selected, used = [], 0
+    for chunk in chunks:
+        tokens = count_tokens(chunk) + 1
+        if used + tokens <= token_budget:
+            selected.append(chunk)
+            used += tokens
+    return selected, used
+
+def system_prompt(role):
+    return SYSTEM_TEMPLATE.format(role=role)
+
+def build_messages(role, chunks, history, user_query, context_budget, prompt_budget):
+    """
+    Chat messages for the LLM within the token budgets; history ends with the new query.
+    Of the previous request's prompt, the system message and the turns before the
+    previous one stay byte-identical (see the module docstring).
+    Returns (messages, stats) where stats holds the token counts for logging.
+    """
+    system = system_prompt(role)
+    base_tokens = count_tokens(system) + count_tokens(QUERY_TEMPLATE.format(kb_context="", user_query=user_query))
+    unique = dedupe_chunks(chunks)
+    context_budget = max(0, min(context_budget, prompt_budget - base_tokens))
+    context, context_tokens = select_context(unique, context_budget)
+    earlier_turns = trim_history(history, prompt_budget - base_tokens - context_tokens)[:-1]
+
+    messages = [
+        {"role": "system", "content": system},
+        *earlier_turns,
+        {"role": "user", "content": QUERY_TEMPLATE.format(kb_context="\n".join(context), user_query=user_query)},
+    ]
+    stats = {
+        "prompt_tokens": sum(count_message_tokens(m) for m in messages),
+        "system_tokens": count_message_tokens(messages[0]),
+        "context_tokens": context_tokens,
+        "context_budget": context_budget,  # What the prompt budget left for context after system + query
+        "history_tokens": sum(count_message_tokens(m) for m in earlier_turns),
+        "chunks": f"{len(context)}/{len(chunks)}",
+        "duplicates": len(chunks) - len(unique),
+        "history_messages": len(earlier_turns),
+    }
+    return messages, stats
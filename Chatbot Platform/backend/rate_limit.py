@@ -0,0 +1,59 @@
+"""
+Token-bucket rate limits for chat requests.
+
+Every bot shares one process, one embedding model and one Ollama, so the
+chat routes check two buckets before doing any work: one per bot and one
+per (bot, session). A bucket holds up to `burst` tokens and refills at
+`rate` tokens per second; a request takes one token from each, or from
+neither if either is empty, and is answered 429 with a Retry-After.
+Limits are per process, like the LLM client's: with several workers each
+one keeps its own buckets, so the configured rates apply per worker.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+class RateLimiter:
+    """Keyed token buckets (thread-safe). The least recently used buckets are dropped beyond max_keys."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [tokens, last refill time]
+        self._lock = threading.Lock()
+        self.allowed = {}
+        self.limited = {}
+
+    def _tokens(self, key, rate, burst, now):
+        burst = max(1.0, float(burst))
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [burst, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        return bucket
+
+    def acquire(self, limits, label=None):
+        """
+        Take one token from each of `limits`, a list of (key, rate, burst); a rate of
+        0 or less means unlimited. Returns 0 if the request may go ahead, else the
+        seconds until it could (no tokens are taken then). `label` keys the counters.
+        """
+        now = time.monotonic()
+        with self._lock:
+            buckets = [(self._tokens(key, rate, burst, now), rate)
+                       for key, rate, burst in limits if rate > 0]
+            wait = max([(1 - tokens) / rate for (tokens, _), rate in buckets if tokens < 1], default=0.0)
+            counters = self.limited if wait else self.allowed
+            counters[label] = counters.get(label, 0) + 1
+            if not wait:
+                for bucket, _ in buckets:
+                    bucket[0] -= 1
+        return wait
+
+    def stats(self):
+        with self._lock:
+            return {"buckets": len(self._buckets), "allowed": dict(self.allowed), "limited": dict(self.limited)}
@@ -0,0 +1,81 @@
+"""
+Semantic answer cache for repeat questions.
+
+Each opted-in bot gets a SemanticResponseCache: a small FAISS inner-product
+index over normalized query embeddings of previously answered questions.
+A new query reuses a cached answer when its cosine similarity to a cached
+query is above the threshold and the same knowledge base entries were
+retrieved for it, so the LLM call can be skipped entirely.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+# Defaults for the per-bot "response_cache" config section
+RESPONSE_CACHE_DEFAULTS = {
+    "enabled": False,
+    "threshold": 0.95,   # Minimum cosine similarity between queries
+    "max_entries": 256,
+    "ttl_seconds": 3600,
+}
+
+class SemanticResponseCache:
+    """LRU + TTL bounded answer cache searched by query-embedding similarity."""
+
+    def __init__(self, dim, threshold=0.95, max_entries=256, ttl_seconds=3600):
+        self.threshold = float(threshold)
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+        self._index = faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+        self._entries = OrderedDict()  # id -> (expires_at, context_ids, answer)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.array(vector, dtype='float32').reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def lookup(self, vector, context_ids):
+        """Return the cached answer for a similar query with the same context, or None."""
+        query = self._normalize(vector)
+        context_ids = tuple(context_ids)
+        with self._lock:
+            if self._index.ntotal:
+                scores, ids = self._index.search(query, min(4, self._index.ntotal))
+                now = time.monotonic()
+                for score, entry_id in zip(scores[0], ids[0]):
+                    if entry_id < 0 or score < self.threshold:
+                        break
+                    expires_at, cached_context, answer = self._entries[entry_id]
+                    if expires_at <= now:
+                        self._remove(entry_id)
+                        continue
+                    if cached_context == context_ids:
+                        self._entries.move_to_end(entry_id)
+                        self.hits += 1
+                        return answer
+            self.misses += 1
+            return None
+
+    def store(self, vector, context_ids, answer):
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(self._normalize(vector), np.array([entry_id], dtype='int64'))
+            self._entries[entry_id] = (time.monotonic() + self.ttl, tuple(context_ids), answer)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id):
+        del self._entries[entry_id]
+        self._index.remove_ids(np.array([entry_id], dtype='int64'))
+
+    def stats(self):
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,106 @@
+"""
+Chat session stores.
+
+A session's history is keyed by (bot, session_id), so the same session id
+used with two bots never mixes conversations. Histories are trimmed to a
+token budget (oldest messages first) and expire `ttl` seconds after their
+last answer.
+
+MemorySessionStore keeps sessions in a bounded LRU (single process).
+SQLiteSessionStore keeps them in a SQLite file that every worker process
+can share; it stands in for a Redis-style key-value store with expiry.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from caches import TTLCache
+from tokens import count_message_tokens
+
+def trim_history(history, token_budget):
+    """Drop the oldest messages until the history fits the budget (the last message is always kept)."""
+    total = sum(count_message_tokens(m) for m in history)
+    start = 0
+    while total > token_budget and start < len(history) - 1:
+        total -= count_message_tokens(history[start])
+        start += 1
+    return history[start:]
+
+class MemorySessionStore:
+    """In-process sessions, bounded to max_sessions with LRU eviction and a TTL."""
+
+    def __init__(self, max_sessions, ttl):
+        self._sessions = TTLCache(max_sessions, ttl)
+
+    def get(self, bot_name, session_id):
+        return list(self._sessions.get((bot_name, session_id)) or [])
+
+    def save(self, bot_name, session_id, history):
+        self._sessions.set((bot_name, session_id), list(history))
+
+    def delete_bot(self, bot_name):
+        self._sessions.discard_where(lambda key: key[0] == bot_name)
+
+    def stats(self):
+        return {"backend": "memory", **self._sessions.stats()}
+
+class SQLiteSessionStore:
+    """Sessions in a SQLite file shared by worker processes; expired rows are purged periodically."""
+
+    PURGE_INTERVAL = 60  # Seconds between sweeps of expired sessions
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = float(ttl)
+        self._local = threading.local()
+        self._last_purge = 0.0
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_sessions ("
+            "bot TEXT NOT NULL, session TEXT NOT NULL, history TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, PRIMARY KEY (bot, session))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS chat_sessions_expiry ON chat_sessions (expires_at)")
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        # A connection inherited across fork must not be reused by the child
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def get(self, bot_name, session_id):
+        row = self._conn().execute(
+            "SELECT history FROM chat_sessions WHERE bot = ? AND session = ? AND expires_at > ?",
+            (bot_name, session_id, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def save(self, bot_name, session_id, history):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO chat_sessions (bot, session, history, expires_at) VALUES (?, ?, ?, ?)",
+            (bot_name, session_id, json.dumps(history), now + self.ttl),
+        )
+        if now - self._last_purge > self.PURGE_INTERVAL:
+            self._last_purge = now
+            conn.execute("DELETE FROM chat_sessions WHERE expires_at <= ?", (now,))
+
+    def delete_bot(self, bot_name):
+        self._conn().execute("DELETE FROM chat_sessions WHERE bot = ?", (bot_name,))
+
+    def stats(self):
+        size = self._conn().execute(
+            "SELECT COUNT(*) FROM chat_sessions WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0]
+        return {"backend": "sqlite", "size": size, "ttl_seconds": self.ttl}
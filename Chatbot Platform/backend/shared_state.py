@@ -0,0 +1,97 @@
+"""
+State shared between worker processes.
+
+In multi-worker mode (see gunicorn.conf.py) each worker is a separate
+process, so in-memory dicts such as chat sessions or themes would diverge.
+SQLiteDict is a small dict-like store of JSON values in one SQLite table
+(WAL mode, so readers never block the writer) that every worker opens.
+Connections are per thread and per process, so the store is safe to create
+before gunicorn forks its workers. file_lock serializes work between
+processes (and threads) through an exclusive lock on a file.
+"""
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+
+class SQLiteDict:
+    """dict-like mapping of str keys to JSON-serializable values backed by SQLite."""
+
+    def __init__(self, path, table):
+        self.path = path
+        self.table = table
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        # A connection inherited across fork must not be reused by the child
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def get(self, key, default=None):
+        row = self._conn().execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def __getitem__(self, key):
+        row = self._conn().execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __setitem__(self, key, value):
+        self._conn().execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)", (key, json.dumps(value))
+        )
+
+    def __contains__(self, key):
+        return self._conn().execute(f"SELECT 1 FROM {self.table} WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self._conn().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        self._conn().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        return value
+
+    def keys(self):
+        return [row[0] for row in self._conn().execute(f"SELECT key FROM {self.table}")]
+
+    def items(self):
+        return [(key, json.loads(value)) for key, value in self._conn().execute(f"SELECT key, value FROM {self.table}")]
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on `path` (created if missing) for the with block; blocks until it is free."""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # Gives up after ~10 s: try again
+                    break
+                except OSError:
+                    pass
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
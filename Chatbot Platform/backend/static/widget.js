@@ -289,6 +289,7 @@
 
   // Helper: add message to chat window
   function addMessage(text, fromUser = true) {
+    let bubble = null;
     if (fromUser) {
       // User message - simple bubble on the right
       const msg = document.createElement("div");
@@ -310,6 +311,7 @@
       });
 
       messages.appendChild(msg);
+      bubble = msg;
     } else {
       // Bot message - container with avatar and message bubble
       const container = document.createElement("div");
@@ -362,9 +364,11 @@
       container.appendChild(avatar);
       container.appendChild(msg);
       messages.appendChild(container);
+      bubble = msg;
     }
 
     messages.scrollTop = messages.scrollHeight;
+    return bubble;
   }
 
   // Typing indicator element
@@ -456,15 +460,57 @@
         headers: {
           "Content-Type": "application/json",
         },
-        body: JSON.stringify({ query: userMsg, session_id: sessionId }),
+        body: JSON.stringify({ query: userMsg, session_id: sessionId, stream: true }),
       });
-      
-      hideTyping();
-      
-      if (response.ok) {
-        const data = await response.json();
-        addMessage(data.response, false);
-      } else {
+
+      if (response.status === 503 || response.status === 429) {
+        // The model is overloaded or the bot/session is rate limited: show the server's message
+        const data = await response.json().catch(() => ({}));
+        hideTyping();
+        addMessage(data.error || "The model is busy, please retry shortly.", false);
+        return;
+      }
+
+      if (!response.ok || !response.body) {
+        hideTyping();
+        addMessage("Error: Failed to get response from server.", false);
+        return;
+      }
+
+      // Render tokens as they arrive (one JSON object per line)
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let botMsg = null;
+
+      const handleLine = (line) => {
+        if (!line.trim()) return;
+        const chunk = JSON.parse(line);
+        if (chunk.token) {
+          if (!botMsg) {
+            hideTyping();
+            botMsg = addMessage("", false);
+          }
+          botMsg.textContent += chunk.token;
+          messages.scrollTop = messages.scrollHeight;
+        } else if (chunk.done && !botMsg) {
+          hideTyping();
+          botMsg = addMessage(chunk.response || "", false);
+        }
+      };
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        lines.forEach(handleLine);
+      }
+      handleLine(buffer);
+
+      if (!botMsg) {
+        hideTyping();
         addMessage("Error: Failed to get response from server.", false);
       }
     } catch (e) {
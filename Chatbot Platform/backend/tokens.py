@@ -0,0 +1,18 @@
+"""
+Token counting for history and prompt budgets.
+
+Budgets only need to be roughly right, so tokens are estimated from the text
+(one per word or symbol, plus one per further 4 characters of a long word)
+instead of running the LLM's own tokenizer, which Ollama does not expose.
+"""
+import re
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+def count_tokens(text):
+    """Estimated LLM token count of a string."""
+    return sum(1 + (len(piece) - 1) // 4 for piece in _PIECES.findall(text))
+
+def count_message_tokens(message):
+    """Tokens a history message takes in the prompt ("Role: content")."""
+    return 2 + count_tokens(message["content"])